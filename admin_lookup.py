@@ -0,0 +1,133 @@
+# admin_lookup.py
+
+import os
+import pickle
+from typing import Optional
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from boundary_cache import ADMIN_LEVELS, SHAPE_DIR, admin_hierarchy, cache_dir, hierarchy_path, source_fingerprint
+
+# —— Constants ——
+INDEX_NAME = "adm4_index.pkl"
+# Points per STRtree query; bounds the candidate-pair arrays for very large batches
+BATCH_SIZE = 500_000
+
+
+class AdminIndex:
+    """
+    Point-in-polygon index over the union (adm4) boundaries.
+
+    Holds the full-resolution polygons in EPSG:4326, their ADM4 pcodes and
+    an STRtree over them. Only the polygons and codes are pickled; the tree
+    and the prepared geometries are rebuilt on load, which takes
+    milliseconds, while reading the shapefile is what the disk cache saves.
+    """
+
+    def __init__(self, codes: np.ndarray, polygons: np.ndarray, source: dict):
+        self.codes = codes
+        self.polygons = polygons
+        self.source = source
+        self._build()
+
+    def _build(self) -> None:
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+
+    def __getstate__(self) -> dict:
+        return {"codes": self.codes, "polygons": self.polygons, "source": self.source}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._build()
+
+    def locate(self, lon: np.ndarray, lat: np.ndarray, max_distance: Optional[float] = None) -> np.ndarray:
+        """
+        Position (into `codes`) of the polygon holding each point, or -1.
+        Candidates come from the tree's bounding boxes and are confirmed with
+        a vectorized exact test; a point on a shared edge goes to the first
+        polygon. With `max_distance` (degrees), points outside every polygon
+        (e.g. on the coast or in a river mouth) snap to the nearest polygon
+        within that distance.
+        """
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        found = np.full(len(lon), -1)
+        for start in range(0, len(lon), BATCH_SIZE):
+            x, y = lon[start:start + BATCH_SIZE], lat[start:start + BATCH_SIZE]
+            point_idx, poly_idx = self.tree.query(shapely.points(x, y))
+            hit = shapely.intersects_xy(self.polygons[poly_idx], x[point_idx], y[point_idx])
+            # Reversed assignment lets the first matching polygon win
+            found[start + point_idx[hit][::-1]] = poly_idx[hit][::-1]
+
+        missing = np.flatnonzero((found < 0) & ~(np.isnan(lon) | np.isnan(lat)))
+        if max_distance is not None and len(missing):
+            point_idx, poly_idx = self.tree.query_nearest(
+                shapely.points(lon[missing], lat[missing]), max_distance=max_distance
+            )
+            found[missing[point_idx[::-1]]] = poly_idx[::-1]
+        return found
+
+
+def index_path(shape_dir: str = SHAPE_DIR) -> str:
+    return os.path.join(cache_dir(shape_dir), INDEX_NAME)
+
+
+def build_admin_index(shape_dir: str = SHAPE_DIR) -> AdminIndex:
+    """Read the adm4 shapefile, reproject it to EPSG:4326 and index it."""
+    shp_path = os.path.join(shape_dir, ADMIN_LEVELS[4])
+    unions = gpd.read_file(shp_path, columns=["ADM4_PCODE"]).to_crs(epsg=4326)
+    return AdminIndex(unions["ADM4_PCODE"].to_numpy(), unions.geometry.to_numpy(), source_fingerprint(shp_path))
+
+
+def load_admin_index(shape_dir: str = SHAPE_DIR, use_cache: bool = True) -> AdminIndex:
+    """
+    The adm4 index, from its on-disk cache when that was built from the
+    shapefile as it is now; otherwise built and (with `use_cache`) saved.
+    """
+    path = index_path(shape_dir)
+    current = source_fingerprint(os.path.join(shape_dir, ADMIN_LEVELS[4]))
+    if use_cache and os.path.exists(path):
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+        if index.source == current:
+            return index
+
+    index = build_admin_index(shape_dir)
+    if use_cache:
+        os.makedirs(cache_dir(shape_dir), exist_ok=True)
+        # Write to a temporary name first so readers never see a half-written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    return index
+
+
+def assign_admin_codes(
+    lon: np.ndarray,
+    lat: np.ndarray,
+    index: Optional[AdminIndex] = None,
+    shape_dir: str = SHAPE_DIR,
+    max_distance: Optional[float] = None
+) -> pd.DataFrame:
+    """
+    Reverse-geocode a batch of WGS84 points to admin codes.
+    Returns one row per point with ADM4_PCODE (union), ADM3_PCODE (upazila),
+    ADM2_PCODE (district) and ADM1_PCODE (division); NaN where no union
+    matched. Pass a loaded `index` to reuse it across batches.
+    The ADM3/ADM4 columns can be passed to `preprocess_geo(..., units=...)`.
+    Raises FileNotFoundError when the adm4 attribute table (.dbf) is missing.
+    """
+    hierarchy = admin_hierarchy(shape_dir)
+    if hierarchy is None:
+        raise FileNotFoundError(f"Admin hierarchy not found: {hierarchy_path(shape_dir)} is missing")
+    index = index or load_admin_index(shape_dir)
+    found = index.locate(lon, lat, max_distance=max_distance)
+    unions = pd.Series(np.where(found >= 0, index.codes[found], np.nan), name="ADM4_PCODE")
+
+    parents = hierarchy.set_index("ADM4_PCODE")[["ADM3_PCODE", "ADM2_PCODE", "ADM1_PCODE"]]
+    return pd.concat([unions, parents.reindex(unions).reset_index(drop=True)], axis=1)
@@ -2,7 +2,7 @@
 
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
+from functools import partial
 from pathlib import Path
 
 # ─── Paths ─────────────────────────────────────────────────────
@@ -11,6 +11,10 @@ DATASETS = BASE_DIR / "DATASETS"
 CLEANED = DATASETS / "Cleaned_Data"
 GEO_CLEANED = CLEANED / "GEO_DATA"
 SHAPEFILE = DATASETS / "shape_files" / "shape.shp"
+DOWNLOAD_DIR = CLEANED / ".download_cache"
+# Served at app/static/ when server.enableStaticServing is on (.streamlit/config.toml)
+STATIC_DOWNLOAD_DIR = BASE_DIR / "static" / "downloads"
+PREVIEW_ROWS = 20
 
 # ─── Import Chart Functions ─────────────────────────────────────
 from outputs import (
@@ -33,7 +37,15 @@ from outputs import (
     plot_q7_loss_by_reason_bar,
     plot_q12_distribution_sankey,
 )
-from geospatial_outputs import plot_q3_choropleth, plot_q4_choropleth
+from geospatial_outputs import ADMIN_UNIT_NAMES, plot_admin_choropleth, plot_q3_choropleth, plot_q4_choropleth
+from figure_cache import FigureCache
+from downloads import FORMATS, LINK_BYTES, publish_payload, published_url, read_payload
+from table_query import (
+    DIMENSIONS, MONTHS, PAGE_SIZE, columnar_path, distinct_values, month_columns, plan_query, query_table,
+    table_columns, table_dimensions,
+)
+# Figures prebuilt by `python render_figures.py` are read from FIGURE_DIR
+from render_figures import FIGURE_DIR, MAP_FILES
 
 # ─── Cache Loaders ──────────────────────────────────────────────
 @st.cache_data
@@ -45,15 +57,100 @@ def load_geo_csv(fname: str) -> pd.DataFrame:
     return pd.read_csv(GEO_CLEANED / fname)
 
 @st.cache_data
-def load_shapefile() -> gpd.GeoDataFrame:
-    gdf = gpd.read_file(SHAPEFILE)
-    if "ADM2_EN" in gdf.columns:
-        gdf.rename(columns={"ADM2_EN": "q1_d_zila"}, inplace=True)
-    gdf["q1_d_zila"] = gdf["q1_d_zila"].astype(str)
-    return gdf
+def load_preview(path: str, mtime_ns: int, rows: int = PREVIEW_ROWS) -> pd.DataFrame:
+    # mtime_ns keys the cache so a rebuilt table is re-read
+    return pd.read_csv(path, nrows=rows)
+
+@st.cache_data
+def load_columns(path: str, mtime_ns: int) -> list[str]:
+    return table_columns(columnar_path(path, str(DOWNLOAD_DIR)))
+
+@st.cache_data
+def load_values(path: str, mtime_ns: int, column: str) -> list:
+    return distinct_values(path, column, str(DOWNLOAD_DIR))
+
+@st.cache_data
+def load_page(path: str, mtime_ns: int, filters: dict, columns, page: int) -> tuple[pd.DataFrame, int]:
+    return query_table(path, filters, columns, page, cache_dir=str(DOWNLOAD_DIR))
+
+@st.cache_resource
+def figure_cache() -> FigureCache:
+    # One memory tier per server process; the disk tier is shared by all of them
+    cache = FigureCache(str(FIGURE_DIR))
+    # Trim the disk tier to its budget once per server start
+    cache.prune()
+    return cache
+
+# ─── Geospatial Tab ─────────────────────────────────────────────
+@st.fragment
+def geospatial_maps() -> None:
+    # A fragment: the admin-level selector reruns only the maps, never the rest of the page
+    st.header("Geospatial Analysis")
+    # District geometry is built once per process (boundary_cache.district_layer)
+    if SHAPEFILE.exists():
+        st.subheader("Q3: Fishing Sources by District")
+        geo3 = load_geo_csv("Q3_SOURCE_OF_FISHING.csv")
+        st.plotly_chart(figures.figure(plot_q3_choropleth, geo3, shapefile=str(SHAPEFILE), files=MAP_FILES), use_container_width=True)
+
+        st.subheader("Q4: Per-District Monthly Catch")
+        geo4 = load_geo_csv("Q4_MONTHLY_CATCH.csv")
+    # ─── Rename 'District' → 'q1_d_zila' so it matches the GeoDataFrame ───
+        if "District" in geo4.columns:
+            geo4 = geo4.rename(columns={"District": "q1_d_zila"})
+        st.plotly_chart(figures.figure(plot_q4_choropleth, geo4, shapefile=str(SHAPEFILE), files=MAP_FILES), use_container_width=True)
+
+    # ─── Division / upazila / union maps, for the levels that were built ───
+    levels = [n for n in ADMIN_UNIT_NAMES if (GEO_CLEANED / f"Q4_MONTHLY_CATCH_ADM{n}.csv").exists()]
+    if levels:
+        st.subheader("Catch & Fishing Sources by Admin Level")
+        level = st.selectbox("Admin level", levels, index=len(levels) - 1, format_func=ADMIN_UNIT_NAMES.get)
+        geo3 = load_geo_csv(f"Q3_SOURCE_OF_FISHING_ADM{level}.csv")
+        sources = [c for c in geo3.columns if not c.startswith("ADM")]
+        geo4 = load_geo_csv(f"Q4_MONTHLY_CATCH_ADM{level}.csv")
+        months = [c for c in geo4.columns if not c.startswith("ADM")]
+        # The boundary cache is built by build.py / render_figures.py, never during a page view
+        try:
+            st.plotly_chart(figures.figure(plot_admin_choropleth, geo3, level, sources, "Fishing Source Counts", files=MAP_FILES), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_admin_choropleth, geo4, level, months, "Per Capita Fishing Catch", files=MAP_FILES), use_container_width=True)
+        except FileNotFoundError as e:
+            st.warning(f"Admin-level maps are unavailable: {e}")
+
+# ─── Dataset Query ──────────────────────────────────────────────
+@st.fragment
+def dataset_query(datasets: dict[str, Path]) -> None:
+    # Only the chosen table is read, and only its matching rows and columns (table_query.py)
+    st.subheader("🔎 Filter a Dataset")
+    available = {name: path for name, path in datasets.items() if path.exists()}
+    if not available:
+        return
+    name = st.selectbox("Dataset", list(available), key="query_dataset")
+    path = available[name]
+    mtime = path.stat().st_mtime_ns
+    columns = load_columns(str(path), mtime)
+    dimensions = table_dimensions(columns)
+    wide_months = {c.split("--")[0] for c in month_columns(columns)}
+
+    selections = {}
+    for col, dimension in zip(st.columns(len(DIMENSIONS)), DIMENSIONS):
+        if dimension in dimensions:
+            options = load_values(str(path), mtime, dimensions[dimension])
+        elif dimension == "month" and wide_months:
+            options = [m for m in MONTHS if m in wide_months]
+        else:
+            continue
+        selections[dimension] = col.multiselect(dimension.title(), options, key=f"query_{dimension}_{name}")
+
+    filters, projection = plan_query(columns, selections)
+    page = st.number_input("Page", min_value=1, value=1, step=1, key=f"query_page_{name}")
+    rows, total = load_page(str(path), mtime, filters, projection, page - 1)
+    st.dataframe(rows, use_container_width=True)
+    first, pages = (page - 1) * PAGE_SIZE, -(-total // PAGE_SIZE)
+    shown = f"Rows {first + 1:,}–{first + len(rows):,}" if len(rows) else "No rows on this page"
+    st.caption(f"{shown} of {total:,} matching · {pages:,} pages")
 
 # ─── Sidebar Page Switcher ──────────────────────────────────────
 st.set_page_config(page_title="Bangladesh Fisheries Dashboard", layout="wide")
+figures = figure_cache()
 st.sidebar.title("📂 Navigation")
 page = st.sidebar.radio("Go to", ["📊 Dashboard", "📄 Data & Reports"])
 
@@ -133,7 +230,8 @@ if page == "📊 Dashboard":
     """)
 
 
-    tab1, tab2 = st.tabs(["📊 Interactive Visuals", "🗺️ Geospatial Maps"])
+    # Stateful tabs: only the selected tab's body runs on a rerun
+    tab1, tab2 = st.tabs(["📊 Interactive Visuals", "🗺️ Geospatial Maps"], key="dashboard_tab", on_change="rerun")
 
     with tab1:
         section = st.selectbox("Choose a Data Category", (
@@ -149,69 +247,59 @@ if page == "📊 Dashboard":
 
         if section == "Q3 – Fishing Techniques":
             df = load_csv("Q3_SOURCE_OF_FISHING.csv")
-            st.plotly_chart(plot_q3_source_bar(df), use_container_width=True)
-            st.plotly_chart(plot_q3_source_grouped_bar(df), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_q3_source_bar, df), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_q3_source_grouped_bar, df), use_container_width=True)
 
         elif section == "Q4 – Monthly Catch Trends":
             df = load_csv("Q4_MONTHLY_CATCH.csv")
             chart = st.radio("Select chart type", ["Bar", "Line", "Area"])
-            st.plotly_chart({
+            st.plotly_chart(figures.figure({
                 "Bar": plot_q4_monthly_catch_bar,
                 "Line": plot_q4_monthly_catch_line,
                 "Area": plot_q4_monthly_catch_area
-            }[chart](df), use_container_width=True)
+            }[chart], df), use_container_width=True)
 
         elif section == "Q4 – Top 10 Species":
             df = load_csv("Q4_MONTHLY_FISH_CATCH.csv")
             chart = st.radio("Select chart type", ["Bar", "Box", "Stacked Bar", "Line"])
-            st.plotly_chart({
+            st.plotly_chart(figures.figure({
                 "Bar": plot_q4_top_species_bar,
                 "Box": plot_q4_top_species_box,
                 "Stacked Bar": plot_q4_top_species_stacked_bar,
                 "Line": plot_q4_top_species_line
-            }[chart](df), use_container_width=True)
+            }[chart], df), use_container_width=True)
 
         elif section == "Q5 – Annual Catch by Source":
             df = load_csv("Q5_MONTHLY_TOTALS_BY_SOURCE.csv")
-            st.plotly_chart(plot_q5_annual_catch_by_source_bar(df), use_container_width=True)
-            st.plotly_chart(plot_q5_monthly_catch_by_source_line(df), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_q5_annual_catch_by_source_bar, df), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_q5_monthly_catch_by_source_line, df), use_container_width=True)
 
         elif section == "Q6 – Monthly Wastage":
             df = load_csv("Q6_MONTHLY_WASTE.csv")
             chart = st.radio("Select chart type", ["Bar", "Line", "Area"])
-            st.plotly_chart({
+            st.plotly_chart(figures.figure({
                 "Bar": plot_q6_monthly_waste_bar,
                 "Line": plot_q6_monthly_waste_line,
                 "Area": plot_q6_monthly_waste_area
-            }[chart](df), use_container_width=True)
+            }[chart], df), use_container_width=True)
 
         elif section == "Q6 – Wastage by Species":
             df = load_csv("Q6_MONTHLY_FISH_WASTE.csv")
-            st.plotly_chart(plot_q6_top_waste_species_bar(df), use_container_width=True)
-            st.plotly_chart(plot_q6_top_waste_species_box(df), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_q6_top_waste_species_bar, df), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_q6_top_waste_species_box, df), use_container_width=True)
 
         elif section == "Q7 – Loss by Reason":
             df = load_csv("Q7_ANNUAL_LOSS_BY_REASON.csv")
-            st.plotly_chart(plot_q7_loss_by_reason_bar(df), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_q7_loss_by_reason_bar, df), use_container_width=True)
 
         elif section == "Q12 – Distribution Channels":
             df = load_csv("Q12_WHERE_DOES_THE_FISH_END_UP.csv")
-            st.plotly_chart(plot_q12_distribution_sankey(df), use_container_width=True)
+            st.plotly_chart(figures.figure(plot_q12_distribution_sankey, df), use_container_width=True)
 
     with tab2:
-        st.header("Geospatial Analysis")
-        gdf = load_shapefile()
-        if not gdf.empty:
-            st.subheader("Q3: Fishing Sources by District")
-            geo3 = load_geo_csv("Q3_SOURCE_OF_FISHING.csv")
-            st.plotly_chart(plot_q3_choropleth(gdf, geo3), use_container_width=True)
-
-            st.subheader("Q4: Per-District Monthly Catch")
-            geo4 = load_geo_csv("Q4_MONTHLY_CATCH.csv")
-        # ─── Rename 'District' → 'q1_d_zila' so it matches the GeoDataFrame ───
-            if "District" in geo4.columns:
-                geo4 = geo4.rename(columns={"District": "q1_d_zila"})
-            st.plotly_chart(plot_q4_choropleth(gdf, geo4), use_container_width=True)
+        # Skipped entirely unless the maps tab is the one selected
+        if tab2.open:
+            geospatial_maps()
 
 # ────────────────────────────────────────────────────────────────
 # 🟦 PAGE 2: DATA & REPORTS
@@ -247,18 +335,36 @@ elif page == "📄 Data & Reports":
 
     for i, (name, path) in enumerate(datasets.items()):
         if path.exists():
-            df = load_csv(path.name) if "GEO" not in name else load_geo_csv(path.name)
             with st.expander(f"📁 {name}"):
-                st.dataframe(df.head(20), use_container_width=True)
-                st.download_button(
-                    label="⬇️ Download CSV",
-                    data=df.to_csv(index=False).encode("utf-8"),
-                    file_name=path.name,
-                    mime="text/csv",
-                    key=f"download_{i}_{path.name}"  # ✅ now fully unique
-                )
+                # Only the preview rows are read here; download payloads are
+                # built on click and cached by file hash (downloads.py)
+                st.dataframe(load_preview(str(path), path.stat().st_mtime_ns), use_container_width=True)
+                st.caption(f"{path.stat().st_size / 1e6:.1f} MB on disk")
+                large = path.stat().st_size > LINK_BYTES
+                for col, (fmt, (suffix, mime, label)) in zip(st.columns(len(FORMATS)), FORMATS.items()):
+                    file_name = path.name.removesuffix(".csv") + suffix
+                    if not large:
+                        col.download_button(
+                            label=f"⬇️ {label}",
+                            data=partial(read_payload, str(path), fmt, str(DOWNLOAD_DIR)),
+                            file_name=file_name,
+                            mime=mime,
+                            on_click="ignore",
+                            key=f"download_{i}_{fmt}_{path.name}"  # ✅ now fully unique
+                        )
+                        continue
+                    # Large tables are linked from static serving so no
+                    # session holds them in memory; the file is placed there
+                    # on the first click after each edit
+                    url = published_url(str(path), fmt, str(STATIC_DOWNLOAD_DIR))
+                    if url is None and col.button(f"⚙️ Prepare {label}", key=f"publish_{i}_{fmt}_{path.name}"):
+                        url = publish_payload(str(path), fmt, str(DOWNLOAD_DIR), str(STATIC_DOWNLOAD_DIR))
+                    if url is not None:
+                        col.markdown(f'<a href="{url}" download="{file_name}">⬇️ {label}</a>', unsafe_allow_html=True)
         else:
             st.warning(f"❌ File missing: {path.name}")
 
+    dataset_query(datasets)
+
 
 
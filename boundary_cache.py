@@ -0,0 +1,369 @@
+# boundary_cache.py
+
+from __future__ import annotations
+
+import json
+import os
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from lazy_imports import lazy_import
+
+# GeoPandas and Shapely load only when a shapefile or GeoParquet layer is
+# read; serving the cached GeoJSON needs neither
+gpd = lazy_import("geopandas")
+shapely = lazy_import("shapely")
+
+# —— Constants ——
+SHAPE_DIR = "DATASETS/shape_files"
+CACHE_DIRNAME = ".boundary_cache"
+INDEX_NAME = "index.json"
+
+# Admin level → BBS boundary shapefile. Every level has ADM{n}_EN and
+# ADM{n}_PCODE plus the codes of its parents; adm2 is the same layer as shape.shp.
+ADMIN_LEVELS = {
+    0: "bgd_admbnda_adm0_bbs_20201113.shp",  # country
+    1: "bgd_admbnda_adm1_bbs_20201113.shp",  # division
+    2: "bgd_admbnda_adm2_bbs_20201113.shp",  # district (zila)
+    3: "bgd_admbnda_adm3_bbs_20201113.shp",  # upazila
+    4: "bgd_admbnda_adm4_bbs_20201113.shp",  # union
+}
+
+ADMIN_UNIT_NAMES = {0: "Country", 1: "Division", 2: "District", 3: "Upazila", 4: "Union"}
+
+# Level of detail → (simplification tolerance, coordinate grid), in degrees.
+# At Bangladesh's latitude 0.001° is roughly 100 m.
+LODS = {
+    "high":   (0.0005, 0.00001),
+    "medium": (0.002, 0.0001),
+    "low":    (0.01, 0.001),
+}
+# Smallest map zoom each level of detail is drawn at (zoom 7 shows the whole country)
+LOD_MIN_ZOOM = {"high": 9, "medium": 7, "low": 0}
+
+# Shapefile parts whose content defines the cached boundaries
+_SOURCE_EXTS = (".shp", ".dbf", ".prj")
+
+
+def cache_dir(shape_dir: str = SHAPE_DIR) -> str:
+    """The boundary cache sits next to the shapefiles in a hidden `.boundary_cache/` folder."""
+    return os.path.join(shape_dir, CACHE_DIRNAME)
+
+
+def boundary_path(level: int, lod: str, shape_dir: str = SHAPE_DIR) -> str:
+    """Location of one admin level's GeoJSON at one level of detail."""
+    return os.path.join(cache_dir(shape_dir), f"adm{level}_{lod}.geojson")
+
+
+def lod_for_zoom(zoom: float) -> str:
+    """The coarsest level of detail that still looks exact at a map zoom."""
+    return next(lod for lod, min_zoom in LOD_MIN_ZOOM.items() if zoom >= min_zoom)
+
+
+def has_source(shp_path: str) -> bool:
+    """True when every shapefile part that defines the boundaries exists."""
+    base = os.path.splitext(shp_path)[0]
+    return all(os.path.exists(base + ext) for ext in _SOURCE_EXTS)
+
+
+def source_fingerprint(shp_path: str) -> dict[str, list[int]]:
+    """Byte size and mtime of the shapefile parts that define its boundaries."""
+    base = os.path.splitext(shp_path)[0]
+    fingerprint = {}
+    for ext in _SOURCE_EXTS:
+        stat = os.stat(base + ext)
+        fingerprint[ext] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+
+def _read_index(shape_dir: str) -> dict:
+    path = os.path.join(cache_dir(shape_dir), INDEX_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(obj: dict, path: str) -> None:
+    # Write to a temporary name first so readers never see a half-written file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def is_level_fresh(level: int, shape_dir: str = SHAPE_DIR) -> bool:
+    """
+    True when every level-of-detail file of `level` exists and was built from
+    the shapefile as it is now (same byte size and modification time).
+    """
+    entry = _read_index(shape_dir).get(f"adm{level}")
+    shp_path = os.path.join(shape_dir, ADMIN_LEVELS[level])
+    if entry is None or not os.path.exists(shp_path):
+        return False
+    return (
+        entry["source"] == source_fingerprint(shp_path)
+        and all(os.path.exists(boundary_path(level, lod, shape_dir)) for lod in entry["lods"])
+    )
+
+
+def simplify_boundaries(geometry: gpd.GeoSeries, tolerance: float, grid: float) -> gpd.GeoSeries:
+    """
+    Simplify a polygon coverage and snap it to a coordinate grid.
+    Shared edges are simplified once (`simplify_coverage`, GEOS ≥ 3.12), so
+    neighbouring units keep meeting without gaps or overlaps; older GEOS
+    falls back to per-polygon topology-preserving simplification.
+    """
+    if hasattr(geometry, "simplify_coverage"):
+        simplified = geometry.simplify_coverage(tolerance)
+    else:
+        simplified = geometry.simplify(tolerance, preserve_topology=True)
+    return simplified.set_precision(grid)
+
+
+def _level_frame(gdf: gpd.GeoDataFrame, level: int) -> gpd.GeoDataFrame:
+    """
+    Keep what the maps need: the unit's name and the codes of its parents,
+    indexed by the unit's own admin code (the GeoJSON feature id).
+    """
+    parents = {f"ADM{k}_PCODE": f"adm{k}" for k in range(level) if f"ADM{k}_PCODE" in gdf}
+    frame = gdf[[f"ADM{level}_PCODE", f"ADM{level}_EN", *parents, "geometry"]].rename(
+        columns={f"ADM{level}_EN": "name", **parents}
+    )
+    return frame.set_index(f"ADM{level}_PCODE").rename_axis(None)
+
+
+def build_level(level: int, shape_dir: str = SHAPE_DIR, lods: Optional[dict] = None) -> list[str]:
+    """
+    Reproject one admin level to EPSG:4326 once and write a simplified,
+    quantized GeoJSON per level of detail. Returns the written paths.
+    """
+    lods = lods or LODS
+    shp_path = os.path.join(shape_dir, ADMIN_LEVELS[level])
+    os.makedirs(cache_dir(shape_dir), exist_ok=True)
+
+    frame = _level_frame(gpd.read_file(shp_path).to_crs(epsg=4326), level)
+    paths = []
+    for lod, (tolerance, grid) in lods.items():
+        simplified = frame.set_geometry(simplify_boundaries(frame.geometry, tolerance, grid))
+        path = boundary_path(level, lod, shape_dir)
+        _write_json(simplified.to_geo_dict(show_bbox=False), path)
+        paths.append(path)
+
+    index = _read_index(shape_dir)
+    index[f"adm{level}"] = {"source": source_fingerprint(shp_path), "lods": list(lods)}
+    _write_json(index, os.path.join(cache_dir(shape_dir), INDEX_NAME))
+    return paths
+
+
+def build_boundary_cache(
+    levels: Iterable[int] = ADMIN_LEVELS,
+    shape_dir: str = SHAPE_DIR,
+    force: bool = False
+) -> list[str]:
+    """
+    One-time build of the simplified boundaries for every admin level.
+    Fresh levels are left untouched unless `force=True`. Returns the paths
+    of all cached files.
+    """
+    paths = []
+    for level in levels:
+        if force or not is_level_fresh(level, shape_dir):
+            build_level(level, shape_dir)
+        paths.extend(boundary_path(level, lod, shape_dir) for lod in _read_index(shape_dir)[f"adm{level}"]["lods"])
+    return paths
+
+
+def layer_path(shp_path: str) -> str:
+    """GeoParquet copy of a shapefile, kept in the boundary cache next to it."""
+    directory, name = os.path.split(shp_path)
+    return os.path.join(cache_dir(directory), os.path.splitext(name)[0] + ".parquet")
+
+
+def prepare_district_layer(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    District layer as the choropleths use it: ADM2_EN renamed to `q1_d_zila`
+    (string) and geometry in EPSG:4326. Already prepared layers pass
+    through unchanged (reprojection is skipped when the CRS matches).
+    """
+    gdf = gdf.rename(columns={"ADM2_EN": "q1_d_zila"})
+    gdf["q1_d_zila"] = gdf["q1_d_zila"].astype(str)
+    return gdf.to_crs(epsg=4326)
+
+
+def is_layer_fresh(shp_path: str) -> bool:
+    """True when the GeoParquet copy exists and was built from the shapefile as it is now."""
+    entry = _read_index(os.path.dirname(shp_path)).get(os.path.basename(shp_path))
+    return (
+        entry is not None
+        and os.path.exists(layer_path(shp_path))
+        and entry["source"] == source_fingerprint(shp_path)
+    )
+
+
+def build_district_layer(shp_path: str) -> str:
+    """
+    Write the prepared district layer (`prepare_district_layer`) as
+    GeoParquet, so the dashboard skips the shapefile read, rename and
+    reprojection on a cold start. Geometry is stored at the "high" level of
+    detail, which is what the maps draw anyway. Returns the GeoParquet path.
+    """
+    shape_dir = os.path.dirname(shp_path)
+    path = layer_path(shp_path)
+    os.makedirs(cache_dir(shape_dir), exist_ok=True)
+
+    layer = prepare_district_layer(gpd.read_file(shp_path))
+    layer = layer.set_geometry(simplify_boundaries(layer.geometry, *LODS["high"]))
+    # Write to a temporary name first so readers never see a half-written file
+    tmp_path = path + ".tmp"
+    layer.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+    index = _read_index(shape_dir)
+    index[os.path.basename(shp_path)] = {"source": source_fingerprint(shp_path)}
+    _write_json(index, os.path.join(cache_dir(shape_dir), INDEX_NAME))
+    return path
+
+
+def _read_layer(path: str) -> gpd.GeoDataFrame:
+    # The layer is always EPSG:4326; setting that directly skips parsing the
+    # PROJJSON in the GeoParquet metadata, which costs more than the geometry.
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    geometry = shapely.from_wkb(table.column("geometry").to_numpy(zero_copy_only=False))
+    return gpd.GeoDataFrame(table.drop_columns(["geometry"]).to_pandas(), geometry=geometry, crs="EPSG:4326")
+
+
+def load_district_layer(shp_path: str) -> gpd.GeoDataFrame:
+    """
+    The prepared district layer, from its GeoParquet copy when fresh,
+    otherwise read from the shapefile and prepared on the fly.
+    """
+    if is_layer_fresh(shp_path):
+        return _read_layer(layer_path(shp_path))
+    return prepare_district_layer(gpd.read_file(shp_path))
+
+
+class SharedGeoJSON(dict):
+    """
+    A GeoJSON dict that is never deep-copied. Plotly deep-copies every trace
+    property when a figure is built, which for boundaries means copying
+    every coordinate on each rerun; memoized layers are read-only, so the
+    copy can share them.
+    """
+
+    def __deepcopy__(self, memo: dict) -> "SharedGeoJSON":
+        return self
+
+
+class DistrictLayer:
+    """
+    District boundaries as the choropleths ship them: a GeoJSON whose
+    feature ids are the district names (`q1_d_zila`), and `index`, those
+    names in feature order. Statistic tables are aligned to the map with
+    `table.set_index('q1_d_zila').reindex(layer.index)`.
+    """
+
+    def __init__(self, geojson: dict):
+        self.geojson = geojson
+        self.index = pd.Index([f["id"] for f in geojson["features"]], name="q1_d_zila")
+
+
+def _name_features(geojson: dict, key: str) -> dict:
+    # Re-key features by district name and drop properties the maps never read
+    return SharedGeoJSON(
+        type="FeatureCollection",
+        features=[
+            {"type": "Feature", "id": str(f["properties"][key]), "properties": {}, "geometry": f["geometry"]}
+            for f in geojson["features"]
+        ],
+    )
+
+
+def layer_from_frame(gdf: gpd.GeoDataFrame) -> DistrictLayer:
+    """A `DistrictLayer` built from a district GeoDataFrame (raw `ADM2_EN` or prepared), not memoized."""
+    layer = prepare_district_layer(gdf)
+    return DistrictLayer(_name_features(layer[["q1_d_zila", "geometry"]].to_geo_dict(show_bbox=False), "q1_d_zila"))
+
+
+@lru_cache(maxsize=8)
+def _district_layer(shp_path: str, lod: Optional[str], fingerprint: tuple, mtime_ns: Optional[int]) -> DistrictLayer:
+    # `fingerprint` and `mtime_ns` only key the memo to the files' current state
+    if lod is not None:
+        geojson = _load_geojson(boundary_path(2, lod, os.path.dirname(shp_path)), mtime_ns)
+        return DistrictLayer(_name_features(geojson, "name"))
+    return layer_from_frame(load_district_layer(shp_path))
+
+
+def district_layer(shp_path: str, zoom: float = 7) -> DistrictLayer:
+    """
+    The district layer for a map zoom, built once per process and reused by
+    every choropleth and rerun. Uses the cached adm2 boundaries at the
+    level of detail for `zoom` when they are fresh, else the district layer
+    (`load_district_layer`). Rebuilt only when the shapefile or the
+    boundary cache changes.
+    """
+    shape_dir = os.path.dirname(shp_path)
+    fingerprint = tuple(tuple(v) for v in source_fingerprint(shp_path).values())
+    if is_level_fresh(2, shape_dir):
+        lod = lod_for_zoom(zoom)
+        path = boundary_path(2, lod, shape_dir)
+        if os.path.exists(path):
+            return _district_layer(shp_path, lod, fingerprint, os.stat(path).st_mtime_ns)
+    return _district_layer(shp_path, None, fingerprint, None)
+
+
+def hierarchy_path(shape_dir: str = SHAPE_DIR) -> str:
+    """The adm4 attribute table (.dbf) that holds the admin hierarchy."""
+    return os.path.splitext(os.path.join(shape_dir, ADMIN_LEVELS[4]))[0] + ".dbf"
+
+
+@lru_cache(maxsize=4)
+def _admin_hierarchy(dbf_path: str, size: int, mtime_ns: int) -> pd.DataFrame:
+    # `size` and `mtime_ns` only key the memo to the file's current state
+    table = gpd.read_file(dbf_path, ignore_geometry=True)
+    return table[[c for k in range(1, 5) for c in (f"ADM{k}_PCODE", f"ADM{k}_EN")]]
+
+
+def admin_hierarchy(shape_dir: str = SHAPE_DIR) -> Optional[pd.DataFrame]:
+    """
+    Union → upazila → district → division lookup: one row per union with
+    ADM{k}_PCODE and ADM{k}_EN for k = 1..4, or None when the adm4 attribute
+    table is missing. Only the .dbf is read (no geometry). Memoized per
+    process until the .dbf changes; treat it as read-only.
+    """
+    dbf_path = hierarchy_path(shape_dir)
+    if not os.path.exists(dbf_path):
+        return None
+    stat = os.stat(dbf_path)
+    return _admin_hierarchy(dbf_path, stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=16)
+def _load_geojson(path: str, mtime_ns: int) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_boundaries(level: int, zoom: float = 7, shape_dir: str = SHAPE_DIR) -> Optional[dict]:
+    """
+    Cached GeoJSON of one admin level at the level of detail for `zoom`, or
+    None when the cache is missing or stale. Features are keyed by admin
+    code (`id`) and carry `name` plus parent codes (`adm0`, `adm1`, ...).
+    Parsed files are memoized per process; treat them as read-only.
+    """
+    if not is_level_fresh(level, shape_dir):
+        return None
+    path = boundary_path(level, lod_for_zoom(zoom), shape_dir)
+    if not os.path.exists(path):
+        return None
+    return _load_geojson(path, os.stat(path).st_mtime_ns)
+
+
+if __name__ == "__main__":
+    district_shapefile = os.path.join(SHAPE_DIR, "shape.shp")
+    for p in build_boundary_cache() + [build_district_layer(district_shapefile)]:
+        print(f"cached → {p} ({os.path.getsize(p) / 1e6:.2f} MB)")
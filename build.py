@@ -0,0 +1,196 @@
+# build.py
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Iterable
+
+from survey_io import FISHER_FILES, file_digest
+
+# —— Paths ——
+DATA_DIR = "DATASETS"
+CLEANED_DIR = f"{DATA_DIR}/Cleaned_Data"
+GEO_DIR = f"{CLEANED_DIR}/GEO_DATA"
+MANIFEST = f"{CLEANED_DIR}/build_manifest.json"
+
+# —— Inputs ——
+# Named groups of files whose content an output depends on. Pipeline source
+# files are inputs too, so a code change rebuilds what it can affect.
+SURVEY = [f"{DATA_DIR}/{name}" for name in FISHER_FILES]
+FISH_SPECIES = [f"{DATA_DIR}/fish_species.csv"]
+DISTRICT_LABELS = [f"{DATA_DIR}/new_district_labels.csv"]
+# The adm4 attribute table holds the union → upazila → district → division hierarchy
+ADMIN_HIERARCHY = [f"{DATA_DIR}/shape_files/bgd_admbnda_adm4_bbs_20201113.dbf"]
+SURVEY_CODE = ["survey_io.py", "survey_schema.py", "survey_session.py"]
+MAIN_CODE = SURVEY_CODE + ["preprocessing.py"]
+GEO_CODE = MAIN_CODE + ["boundary_cache.py", "geospatial_preprocessing.py"]
+
+# —— Outputs ——
+# output file → (pipeline, result key, inputs it depends on)
+OUTPUTS = {
+    f"{CLEANED_DIR}/Q3_SOURCE_OF_FISHING.csv":         ("main", "Q3_source_of_fishing", SURVEY + MAIN_CODE),
+    f"{CLEANED_DIR}/Q4_MONTHLY_CATCH.csv":             ("main", "Q4_monthly_catch", SURVEY + MAIN_CODE),
+    f"{CLEANED_DIR}/Q4_MONTHLY_FISH_CATCH.csv":        ("main", "Q4_top_species", SURVEY + FISH_SPECIES + MAIN_CODE),
+    f"{CLEANED_DIR}/Q5_MONTHLY_TOTALS_BY_SOURCE.csv":  ("main", "Q5_by_source", SURVEY + MAIN_CODE),
+    f"{CLEANED_DIR}/Q6_MONTHLY_WASTE.csv":             ("main", "Q6_monthly_waste", SURVEY + MAIN_CODE),
+    f"{CLEANED_DIR}/Q6_MONTHLY_FISH_WASTE.csv":        ("main", "Q6_top_waste_species", SURVEY + FISH_SPECIES + MAIN_CODE),
+    f"{CLEANED_DIR}/Q7_ANNUAL_LOSS_BY_REASON.csv":     ("main", "Q7_loss_by_reason", SURVEY + MAIN_CODE),
+    f"{CLEANED_DIR}/Q12_WHERE_DOES_THE_FISH_END_UP.csv": ("main", "Q12_distribution", SURVEY + FISH_SPECIES + MAIN_CODE),
+    f"{CLEANED_DIR}/Q12_DISTRIBUTION_FLOWS.csv":       ("main", "Q12_flows", SURVEY + FISH_SPECIES + DISTRICT_LABELS + MAIN_CODE),
+    f"{GEO_DIR}/Q3_SOURCE_OF_FISHING.csv":             ("geo", "Q3_source_of_fishing", SURVEY + DISTRICT_LABELS + GEO_CODE),
+    f"{GEO_DIR}/Q4_MONTHLY_CATCH.csv":                 ("geo", "Q4_monthly_catch", SURVEY + DISTRICT_LABELS + GEO_CODE),
+    f"{GEO_DIR}/Q3_SOURCE_OF_FISHING_ADM1.csv":        ("geo", "Q3_source_of_fishing_adm1", SURVEY + DISTRICT_LABELS + ADMIN_HIERARCHY + GEO_CODE),
+    f"{GEO_DIR}/Q4_MONTHLY_CATCH_ADM1.csv":            ("geo", "Q4_monthly_catch_adm1", SURVEY + DISTRICT_LABELS + ADMIN_HIERARCHY + GEO_CODE),
+    f"{GEO_DIR}/Q3_SOURCE_OF_FISHING_ADM2.csv":        ("geo", "Q3_source_of_fishing_adm2", SURVEY + DISTRICT_LABELS + ADMIN_HIERARCHY + GEO_CODE),
+    f"{GEO_DIR}/Q4_MONTHLY_CATCH_ADM2.csv":            ("geo", "Q4_monthly_catch_adm2", SURVEY + DISTRICT_LABELS + ADMIN_HIERARCHY + GEO_CODE),
+}
+
+
+def load_manifest(path: str = MANIFEST) -> dict:
+    if not os.path.exists(path):
+        return {"inputs": {}, "outputs": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, path: str = MANIFEST) -> None:
+    # Write to a temporary name first so an interrupted build never leaves a truncated manifest
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def fingerprint_inputs(paths: Iterable[str], known: dict) -> dict[str, dict]:
+    """
+    Content fingerprints of the given input files.
+    A file whose size and mtime match its entry in `known` (the previous
+    manifest) keeps the recorded hash without being re-read, so unchanged
+    inputs cost one `stat` each. Missing files get a None hash.
+    """
+    fingerprints = {}
+    for path in paths:
+        if not os.path.exists(path):
+            fingerprints[path] = {"sha256": None}
+            continue
+        stat = os.stat(path)
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        previous = known.get(path, {})
+        if previous.get("size") == entry["size"] and previous.get("mtime_ns") == entry["mtime_ns"]:
+            entry["sha256"] = previous["sha256"]
+        else:
+            entry["sha256"] = file_digest(path)
+        fingerprints[path] = entry
+    return fingerprints
+
+
+def stale_outputs(manifest: dict, fingerprints: dict[str, dict], force: bool = False) -> list[str]:
+    """
+    Outputs that are missing, unrecorded, or were built from inputs whose
+    content has changed since.
+    """
+    stale = []
+    for output, (_, _, inputs) in OUTPUTS.items():
+        recorded = manifest["outputs"].get(output, {}).get("inputs")
+        current = {p: fingerprints[p]["sha256"] for p in inputs}
+        if force or not os.path.exists(output) or recorded != current:
+            stale.append(output)
+    return stale
+
+
+def _run_pipelines(stale: list[str]) -> dict[str, object]:
+    """
+    Recompute the pipelines that own at least one stale output, from one
+    shared parse of the survey files. Returns {output path: DataFrame} for
+    the stale outputs the pipelines produced; the admin-level geo tables
+    are not produced when the adm4 attribute table is missing.
+    """
+    from survey_schema import GEO_QUESTIONS, MAIN_QUESTIONS
+    from survey_session import SurveySession
+
+    pipelines = {OUTPUTS[o][0] for o in stale}
+    questions = (MAIN_QUESTIONS if "main" in pipelines else ()) + (GEO_QUESTIONS if "geo" in pipelines else ())
+    session = SurveySession(DATA_DIR, questions=dict.fromkeys(questions))
+
+    results = {}
+    if "main" in pipelines:
+        from preprocessing import clean_session
+        results["main"] = clean_session(session)
+    if "geo" in pipelines:
+        from geospatial_preprocessing import preprocess_geo
+        tables = [OUTPUTS[o][1] for o in stale if OUTPUTS[o][0] == "geo"]
+        results["geo"] = preprocess_geo(session=session, output_dir=GEO_DIR, tables=tables)
+    return {o: results[OUTPUTS[o][0]][OUTPUTS[o][1]] for o in stale if OUTPUTS[o][1] in results[OUTPUTS[o][0]]}
+
+
+def build(force: bool = False, dry_run: bool = False) -> list[str]:
+    """
+    Incrementally rebuild the cleaned CSVs.
+
+    Hashes every raw input (reusing recorded hashes for files whose size and
+    mtime are unchanged), rebuilds only outputs whose recorded input hashes
+    differ, writes just those files and updates the manifest.
+    Returns the list of rebuilt output paths. Stale outputs a pipeline did
+    not produce (the admin-level tables without the adm4 attribute table)
+    are reported on stderr and stay stale, so the next build retries them.
+    """
+    manifest = load_manifest()
+    inputs = dict.fromkeys(p for _, _, deps in OUTPUTS.values() for p in deps)
+    fingerprints = fingerprint_inputs(inputs, manifest["inputs"])
+    stale = stale_outputs(manifest, fingerprints, force=force)
+    if dry_run or not stale:
+        return stale
+
+    built = _run_pipelines(stale)
+    for output, df in built.items():
+        # preprocess_geo writes its own (stale) tables; the main pipeline returns them
+        if OUTPUTS[output][0] == "main":
+            df.to_csv(output, index=False)
+        manifest["outputs"][output] = {
+            "inputs": {p: fingerprints[p]["sha256"] for p in OUTPUTS[output][2]},
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+    manifest["inputs"] = fingerprints
+    save_manifest(manifest)
+
+    for output in stale:
+        if output not in built:
+            print(f"skipped → {output} (not produced; is the adm4 attribute table missing?)", file=sys.stderr)
+    return list(built)
+
+
+def build_boundaries(shape_dir: str = f"{DATA_DIR}/shape_files") -> list[int]:
+    """
+    Build the map boundary cache (`boundary_cache`) for every admin level
+    whose shapefile parts (.shp, .dbf, .prj) are all present; levels already
+    current are left untouched.
+    The dashboard only reads this cache. Returns the levels checked.
+    """
+    from boundary_cache import ADMIN_LEVELS, build_boundary_cache, has_source
+
+    levels = [level for level, name in ADMIN_LEVELS.items() if has_source(os.path.join(shape_dir, name))]
+    if levels:
+        build_boundary_cache(levels, shape_dir=shape_dir)
+    return levels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild only the cleaned CSVs whose inputs changed.")
+    parser.add_argument("--force", action="store_true", help="rebuild every output")
+    parser.add_argument("--dry-run", action="store_true", help="list stale outputs without rebuilding")
+    args = parser.parse_args()
+
+    # Paths are relative to the repository root
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    rebuilt = build(force=args.force, dry_run=args.dry_run)
+    verb = "stale" if args.dry_run else "rebuilt"
+    for path in rebuilt:
+        print(f"{verb} → {path}")
+    print(f"{len(rebuilt)} of {len(OUTPUTS)} outputs {verb} in {time.perf_counter() - start:.2f}s")
+    if not args.dry_run:
+        levels = build_boundaries()
+        if levels:
+            print(f"boundary cache current → {', '.join(f'adm{level}' for level in levels)}")
@@ -0,0 +1,165 @@
+# downloads.py
+
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from survey_io import file_digest
+
+# —— Constants ——
+CACHE_DIR = "DATASETS/Cleaned_Data/.download_cache"
+# Bytes per read/write when compressing, and per CSV block when converting
+CHUNK_BYTES = 8 * 1024 * 1024
+# Level 1 gzips ~5x faster than 6 for ~30% more bytes; Parquet is the compact option
+GZIP_LEVEL = 1
+PARQUET_COMPRESSION = "zstd"
+# Tables larger than this are downloaded from a link to Streamlit's static
+# file serving (`static/` next to app.py) rather than sent as bytes; Streamlit
+# serves files of at most 200 MB from a static folder of at most 1 GB
+LINK_BYTES = 50 * 1024 * 1024
+STATIC_DIR = "static/downloads"
+STATIC_URL = "app/static/downloads"
+
+# format → (file suffix, MIME type, button label)
+FORMATS = {
+    "csv": (".csv", "text/csv", "CSV"),
+    "csv.gz": (".csv.gz", "application/gzip", "CSV (gzip)"),
+    "parquet": (".parquet", "application/vnd.apache.parquet", "Parquet"),
+}
+
+_digests: dict[tuple[str, int, int], str] = {}
+
+
+def source_hash(path: str) -> str:
+    """SHA-256 of a file, memoized per (path, size, mtime) so it is hashed once per edit."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        _digests[key] = file_digest(path, CHUNK_BYTES)
+    return _digests[key]
+
+
+def _payload_stem(path: str) -> str:
+    # Cleaned and geo tables share file names, so tag each with its location
+    tag = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:8]
+    return f"{Path(path).name.removesuffix('.csv')}-{tag}"
+
+
+def payload_path(path: str, fmt: str, cache_dir: str = CACHE_DIR) -> str:
+    """Cache location of `path` converted to `fmt`, named after its content hash."""
+    return os.path.join(cache_dir, f"{_payload_stem(path)}.{source_hash(path)[:16]}{FORMATS[fmt][0]}")
+
+
+def _write_csv_gzip(path: str, out_path: str) -> None:
+    with open(path, "rb") as src, gzip.open(out_path, "wb", compresslevel=GZIP_LEVEL) as dst:
+        shutil.copyfileobj(src, dst, CHUNK_BYTES)
+
+
+def _write_parquet(path: str, out_path: str) -> None:
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    import pyarrow.parquet as pq
+
+    # Convert block by block, one row group each, so memory stays bounded
+    # whatever the file size
+    try:
+        reader = pv.open_csv(path, read_options=pv.ReadOptions(block_size=CHUNK_BYTES))
+        with pq.ParquetWriter(out_path, reader.schema, compression=PARQUET_COMPRESSION) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    except pa.ArrowInvalid:
+        # A later block did not fit the types inferred from the first one;
+        # read the whole file so inference sees every row
+        pq.write_table(pv.read_csv(path), out_path, compression=PARQUET_COMPRESSION)
+
+
+_WRITERS = {"csv.gz": _write_csv_gzip, "parquet": _write_parquet}
+
+
+def build_payload(path: str, fmt: str, cache_dir: str = CACHE_DIR) -> str:
+    """
+    Path of `path` in download format `fmt`, converting it on the first
+    request after each edit. Plain CSV is served from the source file itself;
+    older conversions of the same file are removed.
+    """
+    if fmt == "csv":
+        return path
+    out_path = payload_path(path, fmt, cache_dir)
+    if os.path.exists(out_path):
+        return out_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a per-process temporary name first so concurrent servers
+    # never read or clobber a half-written file
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    _WRITERS[fmt](path, tmp_path)
+    os.replace(tmp_path, out_path)
+    _remove_older(path, fmt, out_path)
+    return out_path
+
+
+def _remove_older(path: str, fmt: str, keep: str) -> None:
+    # Drop other versions of the same payload from the directory of `keep`
+    directory = os.path.dirname(keep)
+    pattern = re.compile(rf"{re.escape(_payload_stem(path))}\.[0-9a-f]{{16}}{re.escape(FORMATS[fmt][0])}")
+    for name in os.listdir(directory):
+        if pattern.fullmatch(name) and os.path.join(directory, name) != keep:
+            os.remove(os.path.join(directory, name))
+
+
+def read_payload(path: str, fmt: str, cache_dir: str = CACHE_DIR) -> bytes:
+    """
+    Bytes of `path` in format `fmt`, for a deferred `st.download_button`.
+    Only meant for tables up to `LINK_BYTES`; larger ones go through
+    `publish_payload`.
+    """
+    with open(build_payload(path, fmt, cache_dir), "rb") as f:
+        return f.read()
+
+
+def published_url(path: str, fmt: str, static_dir: str = STATIC_DIR) -> Optional[str]:
+    """Static URL of the current `publish_payload` copy, or None if not published yet."""
+    name = os.path.basename(payload_path(path, fmt))
+    return f"{STATIC_URL}/{name}" if os.path.exists(os.path.join(static_dir, name)) else None
+
+
+def publish_payload(path: str, fmt: str, cache_dir: str = CACHE_DIR, static_dir: str = STATIC_DIR) -> str:
+    """
+    Place `path` in format `fmt` in the static folder, so the browser fetches
+    it straight from disk and no session holds it in memory. The cached
+    payload is hard-linked (copied across file systems); older versions are
+    removed. Returns its URL relative to the app.
+    """
+    out_path = build_payload(path, fmt, cache_dir)
+    target = os.path.join(static_dir, os.path.basename(payload_path(path, fmt, cache_dir)))
+    if not os.path.exists(target):
+        os.makedirs(static_dir, exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            os.link(out_path, tmp_path)
+        except OSError:
+            shutil.copyfile(out_path, tmp_path)
+        os.replace(tmp_path, target)
+        _remove_older(path, fmt, target)
+    return f"{STATIC_URL}/{os.path.basename(target)}"
+
+
+def build_all(paths: list[str], formats: Optional[list[str]] = None, cache_dir: str = CACHE_DIR) -> list[str]:
+    """Convert every file in `paths` to each compressed format ahead of time."""
+    formats = formats or list(_WRITERS)
+    return [build_payload(path, fmt, cache_dir) for path in paths for fmt in formats]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-build the compressed downloads of the cleaned tables.")
+    parser.add_argument("--formats", nargs="+", choices=list(_WRITERS), default=None, help="formats to build")
+    args = parser.parse_args()
+
+    paths = sorted(str(p) for p in Path(CACHE_DIR).parent.rglob("*.csv") if not p.name.startswith("."))
+    for out_path in build_all(paths, args.formats):
+        print(f"download → {out_path}")
@@ -0,0 +1,199 @@
+# figure_cache.py
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+import pandas as pd
+import plotly
+import plotly.graph_objects as go
+
+# —— Constants ——
+CACHE_DIR = "DATASETS/Cleaned_Data/.figure_cache"
+# Bound on the serialized figures held in memory per process
+MEMORY_BYTES = 64 * 1024 * 1024
+# Bound on the figure files kept in `CACHE_DIR`, enforced by `FigureCache.prune`
+DISK_BYTES = 512 * 1024 * 1024
+
+
+def data_hash(df: pd.DataFrame) -> str:
+    """SHA-256 of a DataFrame's column names, dtypes, index and values."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+_code_digests: dict[tuple[str, int], str] = {}
+
+
+def _code_hash(fn: Callable) -> str:
+    """Digest of the source file defining `fn`, memoized per (path, mtime)."""
+    path = getattr(sys.modules.get(fn.__module__), "__file__", None)
+    if path is None:
+        return ""
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _code_digests:
+        with open(path, "rb") as f:
+            _code_digests[key] = hashlib.sha256(f.read()).hexdigest()
+    return _code_digests[key]
+
+
+def _arg_token(value) -> object:
+    if isinstance(value, pd.DataFrame):
+        return {"DataFrame": data_hash(value)}
+    return repr(value)
+
+
+def figure_key(fn: Callable, args: tuple, kwargs: dict, files: Iterable[str] = ()) -> str:
+    """
+    Cache key of one figure: the plot function and the file it is defined
+    in, the data hash of every DataFrame argument, the repr of the other
+    arguments, the Plotly version, and the size and mtime of `files` (extra
+    inputs the function reads itself, e.g. shapefiles).
+    """
+    stats = {}
+    for path in files:
+        stat = os.stat(path) if os.path.exists(path) else None
+        stats[path] = None if stat is None else [stat.st_size, stat.st_mtime_ns]
+    token = {
+        "fn": f"{fn.__module__}.{fn.__qualname__}",
+        "code": _code_hash(fn),
+        "plotly": plotly.__version__,
+        "args": [_arg_token(a) for a in args],
+        "kwargs": {k: _arg_token(v) for k, v in sorted(kwargs.items())},
+        "files": stats,
+    }
+    return hashlib.sha256(json.dumps(token, sort_keys=True).encode()).hexdigest()
+
+
+class FigureCache:
+    """
+    Two-tier cache of serialized Plotly figures.
+
+    The memory tier is an LRU bounded by the total UTF-8 size of the JSON
+    it holds; the disk tier is one `<key>.json` per figure in `cache_dir`,
+    shared by every server process and trimmed to `max_disk_bytes` by
+    `prune`. Figures are rebuilt from JSON without validation, so a hit
+    never runs Plotly Express or `update_layout`.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = CACHE_DIR,
+        max_bytes: int = MEMORY_BYTES,
+        max_disk_bytes: int = DISK_BYTES
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        # key → (figure JSON, its size in bytes)
+        self._memory: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """The figure JSON under `key` from memory or disk, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key][0]
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                spec = f.read()
+            # Mark the file as recently used, so `prune` evicts it last
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            # Never written, or pruned by another process
+            return None
+        self._remember(key, spec)
+        return spec
+
+    def put(self, key: str, spec: str) -> None:
+        """Store figure JSON in memory and, when `cache_dir` is set, on disk."""
+        self._remember(key, spec)
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a per-process temporary name first so concurrent servers
+        # never read or clobber a half-written file
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(spec)
+        os.replace(tmp_path, self._path(key))
+
+    def _remember(self, key: str, spec: str) -> None:
+        with self._lock:
+            if key in self._memory:
+                self._bytes -= self._memory.pop(key)[1]
+            # Bytes, not characters: Bengali labels take three bytes each
+            size = len(spec.encode())
+            self._memory[key] = (spec, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._memory) > 1:
+                self._bytes -= self._memory.popitem(last=False)[1][1]
+
+    def figure(self, fn: Callable[..., go.Figure], *args, files: Iterable[str] = (), **kwargs) -> go.Figure:
+        """
+        `fn(*args, **kwargs)`, served from the cache when the same function,
+        data and parameters were rendered before.
+        """
+        key = figure_key(fn, args, kwargs, files)
+        spec = self.get(key)
+        if spec is None:
+            spec = fn(*args, **kwargs).to_json()
+            self.put(key, spec)
+        return go.Figure(json.loads(spec), _validate=False)
+
+    def prune(self, max_disk_bytes: Optional[int] = None) -> list[str]:
+        """
+        Delete the least recently used figure files until those left in
+        `cache_dir` fit in `max_disk_bytes` (default `self.max_disk_bytes`).
+        Recency is the file mtime, which `get` refreshes on every disk hit.
+        Returns the deleted paths. Stale entries (old data, code or Plotly
+        version) are never read again, so they age out first.
+        """
+        budget = self.max_disk_bytes if max_disk_bytes is None else max_disk_bytes
+        if self.cache_dir is None or not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json") and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already pruned by another process
+                pass
+            total -= size
+            removed.append(path)
+        return removed
+
+    def clear(self, disk: bool = False) -> None:
+        """
+        Drop the memory tier, and with `disk=True` the files in `cache_dir`.
+        To bound the disk tier without emptying it, use `prune`.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+        if disk and self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.cache_dir, name))
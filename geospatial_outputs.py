@@ -1,7 +1,11 @@
+import warnings
+from pathlib import Path
+from typing import Optional
+
 import pandas as pd
-import geopandas as gpd
 import plotly.graph_objects as go
-import streamlit as st
+
+from boundary_cache import ADMIN_UNIT_NAMES, DistrictLayer, SharedGeoJSON, cache_dir, district_layer, layer_from_frame, load_boundaries
 
 MONTHS = [
     'January--Magh','February--Falgun','March--Chaitra','April--Boishakh',
@@ -9,56 +13,83 @@ MONTHS = [
     'September--Ashwin','October--Kartik','November--Aghrahan','December--Poush'
 ]
 COLOR_SCALE = 'OrRd'
+MAP_ZOOM = 7
+SHAPE_DIR = Path(__file__).parent / "DATASETS" / "shape_files"
+SHAPEFILE = SHAPE_DIR / "shape.shp"
+
+
+def _align(layer: DistrictLayer, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows of a per-district table in map feature order; districts absent from
+    either side are dropped. A district listed more than once is summed.
+    """
+    table = df.assign(q1_d_zila=df['q1_d_zila'].astype(str)).set_index('q1_d_zila')
+    if table.index.has_duplicates:
+        table = table.groupby(level=0, sort=False).sum(numeric_only=True, min_count=1)
+    return table.reindex(layer.index).dropna(how='all')
 
 
-def plot_q3_choropleth(gdf: gpd.GeoDataFrame, q3_df: pd.DataFrame) -> go.Figure:
-    gdf = gdf.rename(columns={'ADM2_EN': 'q1_d_zila'})
-    gdf['q1_d_zila'] = gdf['q1_d_zila'].astype(str)
-    q3 = q3_df.copy()
-    q3['q1_d_zila'] = q3['q1_d_zila'].astype(str)
+def _map_layer(name: str, gdf: Optional[pd.DataFrame], zoom: float, shapefile: str) -> DistrictLayer:
+    # Deprecated `gdf=`: build the layer from the caller's district GeoDataFrame
+    if gdf is not None:
+        warnings.warn(
+            f"{name}(..., gdf=...) is deprecated; pass zoom= and shapefile= instead",
+            DeprecationWarning, stacklevel=3
+        )
+        return layer_from_frame(gdf)
+    return district_layer(shapefile, zoom)
 
-    merged = gdf.merge(q3, on='q1_d_zila')
-    geojson = merged.to_crs(epsg=4326).__geo_interface__
 
-    sources = [col for col in q3.columns if col != 'q1_d_zila']
+def plot_q3_choropleth(
+    q3_df: pd.DataFrame,
+    zoom: float = MAP_ZOOM,
+    shapefile: str = str(SHAPEFILE),
+    *,
+    gdf: Optional[pd.DataFrame] = None
+) -> go.Figure:
+    layer = _map_layer("plot_q3_choropleth", gdf, zoom, shapefile)
+    merged = _align(layer, q3_df)
+
+    sources = list(merged.columns)
     zmax_dict = {src: merged[src].max() for src in sources}
 
-    fig = go.Figure()
-    for i, src in enumerate(sources):
-        fig.add_trace(go.Choroplethmap(
-            geojson=geojson,
-            locations=merged['q1_d_zila'],
-            z=merged[src],
-            featureidkey='properties.q1_d_zila',
-            colorscale=COLOR_SCALE,
-            zmin=0,
-            zmax=zmax_dict[src],
-            marker_line_width=0.5,
-            colorbar=dict(
-                title=f"{src} count",
-                thickness=15,
-                len=0.5,
-                yanchor='middle',
-                y=0.5
-            ),
-            hovertemplate=(
-                "<b>%{properties.q1_d_zila}</b><br>"
-                f"{src}: " + "%{z:,}<extra></extra>"
-            ),
-            visible=(i == 0)
-        ))
+    # One trace: the boundaries are shipped once and the dropdown only
+    # swaps z, zmax and the labels
+    fig = go.Figure(go.Choroplethmap(
+        geojson=layer.geojson,
+        locations=merged.index,
+        z=merged[sources[0]],
+        colorscale=COLOR_SCALE,
+        zmin=0,
+        zmax=zmax_dict[sources[0]],
+        marker_line_width=0.5,
+        colorbar=dict(
+            title=f"{sources[0]} count",
+            thickness=15,
+            len=0.5,
+            yanchor='middle',
+            y=0.5
+        ),
+        hovertemplate=(
+            "<b>%{location}</b><br>"
+            f"{sources[0]}: " + "%{z:,}<extra></extra>"
+        )
+    ))
 
     buttons = [
         dict(method="update",
              label=src,
              args=[
-                 {"visible": [j == i for j in range(len(sources))]},
+                 {"z": [merged[src]],
+                  "zmax": [zmax_dict[src]],
+                  "colorbar.title.text": f"{src} count",
+                  "hovertemplate": f"<b>%{{location}}</b><br>{src}: %{{z:,}}<extra></extra>"},
                  {"title": {
                      "text": f"Distribution of <i>{src}</i> Fishing Source by District",
                      "x": 0.5
                  }}
              ])
-        for i, src in enumerate(sources)
+        for src in sources
     ]
 
     fig.update_layout(
@@ -76,7 +107,7 @@ def plot_q3_choropleth(gdf: gpd.GeoDataFrame, q3_df: pd.DataFrame) -> go.Figure:
         )],
         map=dict(
             style="carto-positron",
-            zoom=7,
+            zoom=zoom,
             center={"lat": 24.1860, "lon": 90.3563}
         ),
         margin=dict(l=10, r=10, t=120, b=40),
@@ -103,43 +134,44 @@ def plot_q3_choropleth(gdf: gpd.GeoDataFrame, q3_df: pd.DataFrame) -> go.Figure:
     return fig
 
 
-def plot_q4_choropleth(gdf: gpd.GeoDataFrame, q4_df: pd.DataFrame) -> go.Figure:
-    gdf = gdf.rename(columns={'ADM2_EN': 'q1_d_zila'})
-    gdf['q1_d_zila'] = gdf['q1_d_zila'].astype(str)
-    q4 = q4_df.copy()
-    q4['q1_d_zila'] = q4['q1_d_zila'].astype(str)
-
-    merged = gdf.merge(q4, on='q1_d_zila')
-    geojson = merged.to_crs(epsg=4326).__geo_interface__
+def plot_q4_choropleth(
+    q4_df: pd.DataFrame,
+    zoom: float = MAP_ZOOM,
+    shapefile: str = str(SHAPEFILE),
+    *,
+    gdf: Optional[pd.DataFrame] = None
+) -> go.Figure:
+    layer = _map_layer("plot_q4_choropleth", gdf, zoom, shapefile)
+    merged = _align(layer, q4_df)
 
     zmax = {m: merged[m].max() for m in MONTHS}
 
-    fig = go.Figure()
-    for i, month in enumerate(MONTHS):
-        fig.add_trace(go.Choroplethmap(
-            geojson=geojson,
-            locations=merged['q1_d_zila'],
-            z=merged[month],
-            featureidkey='properties.q1_d_zila',
-            colorscale=COLOR_SCALE,
-            zmin=0,
-            zmax=zmax[month],
-            marker_line_width=0.5,
-            hovertemplate=(
-                "<b>%{properties.q1_d_zila}</b><br>"
-                f"{month}: " + "%{z:,}<extra></extra>"
-            ),
-            visible=(i == 0)
-        ))
+    # One trace: the boundaries are shipped once and each slider step only
+    # swaps z, zmax and the hover label
+    fig = go.Figure(go.Choroplethmap(
+        geojson=layer.geojson,
+        locations=merged.index,
+        z=merged[MONTHS[0]],
+        colorscale=COLOR_SCALE,
+        zmin=0,
+        zmax=zmax[MONTHS[0]],
+        marker_line_width=0.5,
+        hovertemplate=(
+            "<b>%{location}</b><br>"
+            f"{MONTHS[0]}: " + "%{z:,}<extra></extra>"
+        )
+    ))
 
     steps = [
         dict(method="update",
              label=month,
              args=[
-                 {"visible": [j == i for j in range(len(MONTHS))]},
+                 {"z": [merged[month]],
+                  "zmax": [zmax[month]],
+                  "hovertemplate": f"<b>%{{location}}</b><br>{month}: %{{z:,}}<extra></extra>"},
                  {"title.text": f"Per Capita Fishing Catch — {month}"}
              ])
-        for i, month in enumerate(MONTHS)
+        for month in MONTHS
     ]
 
     sliders = [dict(
@@ -162,7 +194,7 @@ def plot_q4_choropleth(gdf: gpd.GeoDataFrame, q4_df: pd.DataFrame) -> go.Figure:
         transition=dict(duration=500, easing='cubic-in-out'),
         map=dict(
             style="carto-positron",
-            zoom=7,
+            zoom=zoom,
             center={"lat": 24.1860, "lon": 90.3563}
         ),
         margin=dict(l=20, r=20, t=140, b=100),
@@ -217,13 +249,104 @@ def plot_q4_choropleth(gdf: gpd.GeoDataFrame, q4_df: pd.DataFrame) -> go.Figure:
     return fig
 
 
+def plot_admin_choropleth(
+    table: pd.DataFrame,
+    level: int,
+    columns: list[str],
+    title: str,
+    zoom: float = MAP_ZOOM
+) -> go.Figure:
+    """
+    Choropleth of an admin-level table (`ADM{n}_PCODE`, `ADM{n}_EN`, values),
+    e.g. `Q4_MONTHLY_CATCH_ADM3.csv`, with a dropdown over `columns`.
+
+    Boundaries come from `boundary_cache` at the level of detail for `zoom`
+    and only units present in `table` are shipped. The cache is built by
+    `python build.py` or `python render_figures.py`, never here; a missing
+    or stale cache raises FileNotFoundError. One trace is drawn and the
+    dropdown only swaps its `z` values, so thousands of upazila or union
+    polygons stay interactive.
+    """
+    code, name = f'ADM{level}_PCODE', f'ADM{level}_EN'
+    geojson = load_boundaries(level, zoom, shape_dir=str(SHAPE_DIR))
+    if geojson is None:
+        raise FileNotFoundError(
+            f"No current adm{level} boundaries in {cache_dir(str(SHAPE_DIR))}; "
+            "run `python build.py` or `python boundary_cache.py` to build them"
+        )
+    present = set(table[code])
+    geojson = SharedGeoJSON(
+        type="FeatureCollection",
+        features=[f for f in geojson["features"] if f["id"] in present]
+    )
+    unit = ADMIN_UNIT_NAMES[level]
+
+    fig = go.Figure(go.Choroplethmap(
+        geojson=geojson,
+        locations=table[code],
+        z=table[columns[0]],
+        text=table[name],
+        colorscale=COLOR_SCALE,
+        zmin=0,
+        zmax=table[columns[0]].max(),
+        marker_line_width=0.5 if level <= 2 else 0.1,
+        colorbar=dict(title=columns[0], thickness=15, len=0.5, yanchor='middle', y=0.5),
+        hovertemplate="<b>%{text}</b><br>%{z:,}<extra></extra>"
+    ))
+
+    buttons = [
+        dict(method="update",
+             label=col,
+             args=[
+                 {"z": [table[col]], "zmax": [table[col].max()], "colorbar.title.text": col},
+                 {"title.text": f"{title} by {unit} — {col}"}
+             ])
+        for col in columns
+    ]
+
+    fig.update_layout(
+        template='plotly_white',
+        title={
+            "text": f"{title} by {unit} — {columns[0]}",
+            "x": 0.5, "xanchor": "center"
+        },
+        updatemenus=[dict(
+            buttons=buttons,
+            direction="down",
+            showactive=True,
+            x=0, xanchor="left",
+            y=1.1, yanchor="top"
+        )],
+        map=dict(
+            style="carto-positron",
+            zoom=zoom,
+            center={"lat": 24.1860, "lon": 90.3563}
+        ),
+        margin=dict(l=10, r=10, t=120, b=40),
+        width=1000,
+        height=800,
+        font=dict(family="Arial", color="#333")
+    )
+
+    fig.add_annotation(
+        text="Data: Bangladesh Fisheries Census 2024",
+        showarrow=False,
+        x=0.5, y=1.05,
+        xref="paper", yref="paper",
+        font=dict(size=12, color="gray")
+    )
+
+    return fig
+
+
 def show_maps(shapefile_path: str, q3_csv: str, q4_csv: str) -> None:
-    gdf = gpd.read_file(shapefile_path)
+    import streamlit as st
+
     q3_df = pd.read_csv(q3_csv, dtype={'q1_d_zila': str})
     q4_df = pd.read_csv(q4_csv, dtype={'q1_d_zila': str})
 
-    fig1 = plot_q3_choropleth(gdf, q3_df)
-    fig2 = plot_q4_choropleth(gdf, q4_df)
+    fig1 = plot_q3_choropleth(q3_df, shapefile=shapefile_path)
+    fig2 = plot_q4_choropleth(q4_df, shapefile=shapefile_path)
 
     st.plotly_chart(fig1, use_container_width=True)
     st.plotly_chart(fig2, use_container_width=True)
@@ -2,9 +2,17 @@
 
 import os
 import re
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import warnings
+from typing import Iterable, Optional
+
+from boundary_cache import ADMIN_LEVELS, admin_hierarchy
+from preprocessing import map_in_workers, merge_partials
+from survey_io import FISHER_FILES, iter_survey_file, read_survey_shard, survey_shards
+from survey_schema import GEO_QUESTIONS, question_columns, usecols
+from survey_session import SurveySession, build_district_labels
 
 warnings.filterwarnings('ignore')
 
@@ -32,138 +40,335 @@ def load_geo_data(path: str) -> gpd.GeoDataFrame:
     return gpd.read_file(path)
 
 
+Q3_COLUMNS = ['q3_1','q3_2','q3_3','q3_4','q3_5']
+
+
+def _district_source_counts(frame: pd.DataFrame) -> pd.Series:
+    """
+    Count fishing-source mentions per (district code, source code) for a
+    survey frame holding `q1_d_zila` and the Q3 columns.
+    """
+    melted = frame[['q1_d_zila', *Q3_COLUMNS]].melt(
+        id_vars=['q1_d_zila'],
+        value_vars=Q3_COLUMNS,
+        var_name='source_type',
+        value_name='Source'
+    )
+    return melted.groupby(['q1_d_zila','Source']).size()
+
+
+def _district_source_table(counts: pd.Series, DIST_LABELS: dict) -> pd.DataFrame:
+    """
+    Label (district code, source code) counts and pivot them into one row per
+    district, one column per source. Codes without a label are dropped.
+    """
+    districts = counts.index.get_level_values(0).map(DIST_LABELS).rename('q1_d_zila')
+    sources = counts.index.get_level_values(1).map(SOURCE).rename('Source')
+    return (
+        counts
+        .groupby([districts, sources])
+        .sum()
+        .unstack(fill_value=0)
+        .rename_axis(columns=None)
+        .reset_index()
+    )
+
+
+def _fisher_catch_table(annual_catch: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-fisher monthly and annual catch in metric tonnes, with the district.
+    `annual_catch` holds `q1_d_zila` plus the Q4 block.
+    """
+    # Resolve month columns (q4_f_{i}_{month}) and annual-total columns
+    # (ending in '_t') once, instead of regex-matching every cell
+    month_cols = {mn: [] for mn in MONTH_MAPPING}
+    for col in annual_catch.columns:
+        m = re.match(r'q4_f_\d+_(\d+)', col)
+        if m:
+            month_cols[int(m.group(1))].append(col)
+    year_cols = [c for c in annual_catch.columns if c.endswith('_t')]
+
+    def tonnes(cols: list[str]) -> np.ndarray:
+        # Add whole columns in file order (missing values count as 0), so each
+        # fisher's total matches a cell-by-cell running sum bit for bit
+        total = np.zeros(len(annual_catch))
+        for col in cols:
+            values = annual_catch[col].to_numpy(dtype=float)
+            total += np.where(np.isnan(values), 0, values)
+        return total / 1000
+
+    return pd.DataFrame({
+        'District': annual_catch['q1_d_zila'],
+        **{name: tonnes(month_cols[mn]) for mn, name in MONTH_MAPPING.items()},
+        'Year Total': tonnes(year_cols),
+    }, index=annual_catch.index)
+
+
+def geo_partials(frame: pd.DataFrame, skip_first: bool = False) -> dict[str, pd.DataFrame]:
+    """
+    Mergeable partial aggregates behind the geo Q3/Q4 tables for one survey
+    frame (a whole file or a chunk of rows): per-(district, source) counts,
+    per-district catch sums and per-district respondent counts, all keyed
+    by the raw district and source codes.
+    `skip_first` drops the frame's first fisher from Q4, matching the
+    placeholder-row drop of the batch path for the very first chunk.
+    """
+    per_fisher = _fisher_catch_table(frame[['q1_d_zila'] + question_columns(frame.columns, 'Q4')])
+    if skip_first:
+        per_fisher = per_fisher.iloc[1:]
+    by_district = per_fisher.groupby('District')
+
+    return {
+        "Q3": _district_source_counts(frame),
+        "Q4_sum": by_district.sum(),
+        "Q4_count": by_district.size(),
+    }
+
+
+def _shard_geo_partials(path: str, shard: Optional[int], skip_first: bool) -> dict[str, pd.DataFrame]:
+    """Worker task: parse one survey shard and return its geo partials."""
+    frame = read_survey_shard(path, shard, columns=usecols(GEO_QUESTIONS))
+    return geo_partials(frame, skip_first=skip_first)
+
+
+def finalize_geo(
+    partials: dict[str, pd.DataFrame],
+    DIST_LABELS: dict,
+    hierarchy: Optional[pd.DataFrame] = None
+) -> dict[str, pd.DataFrame]:
+    """
+    Label merged geo partials with district names and turn them into the
+    district Q3 table and per-capita Q4 table.
+    With the admin `hierarchy`, the district and division tables keyed by
+    pcode (see `admin_tables`) are added as well.
+    """
+    sums = partials["Q4_sum"]
+    sums = sums.groupby(sums.index.map(DIST_LABELS)).sum()
+    counts = partials["Q4_count"]
+    counts = counts.groupby(counts.index.map(DIST_LABELS)).sum().reindex(sums.index)
+    GEO_Q4 = sums.div(counts, axis=0).rename_axis('District').reset_index().round(2)
+    results = {
+        "Q3_source_of_fishing": _district_source_table(partials["Q3"], DIST_LABELS),
+        "Q4_monthly_catch": GEO_Q4
+    }
+    if hierarchy is None:
+        return results
+
+    # Survey district code → district name → ADM2 pcode
+    district_codes = _district_pcodes(hierarchy)
+    to_pcode = lambda codes: codes.map(DIST_LABELS).map(district_codes).rename('ADM2_PCODE')
+    q3 = partials["Q3"]
+    q4 = partials["Q4_sum"].assign(Respondents=partials["Q4_count"])
+    base = {
+        "Q3": (
+            q3
+            .groupby([to_pcode(q3.index.get_level_values(0)), q3.index.get_level_values(1).map(SOURCE)])
+            .sum()
+            .unstack(fill_value=0)
+            .rename_axis(columns=None)
+        ),
+        "Q4": q4.groupby(to_pcode(q4.index)).sum(),
+    }
+    for level in (1, 2):
+        results.update(admin_tables(base, hierarchy, level))
+    return results
+
+
+def _district_pcodes(hierarchy: pd.DataFrame) -> pd.Series:
+    """District name (ADM2_EN, as used by new_district_labels.csv) → ADM2 pcode."""
+    return hierarchy.drop_duplicates('ADM2_PCODE').set_index('ADM2_EN')['ADM2_PCODE']
+
+
+def admin_base_tables(
+    units: pd.Series,
+    sources: pd.DataFrame,
+    per_fisher: pd.DataFrame
+) -> dict[str, pd.DataFrame]:
+    """
+    Additive base tables for admin-level maps, keyed by each fisher's admin
+    code. `units` holds one pcode per fisher at a single admin level and is
+    named after that level's code column (e.g. 'ADM3_PCODE'); `sources` (the
+    Q3 block) and `per_fisher` (`_fisher_catch_table`) share its row index.
+    Returns fishing-source mention counts (Q3) and catch sums plus
+    respondent counts (Q4) per unit; every coarser level is a sum of these.
+    """
+    counts = _district_source_counts(pd.concat([units.rename('q1_d_zila'), sources], axis=1))
+    labels = counts.index.get_level_values(1).map(SOURCE).rename('Source')
+    q3 = (
+        counts
+        .groupby([counts.index.get_level_values(0).rename(units.name), labels])
+        .sum()
+        .unstack(fill_value=0)
+        .rename_axis(columns=None)
+    )
+    q4 = per_fisher.drop(columns='District').assign(Respondents=1).groupby(units).sum()
+    return {"Q3": q3, "Q4": q4}
+
+
+def rollup_admin(base: pd.DataFrame, hierarchy: pd.DataFrame, level: int) -> pd.DataFrame:
+    """
+    Sum a table keyed by admin codes (index named 'ADM{n}_PCODE') up to the
+    coarser admin `level` through the pcode hierarchy.
+    """
+    code, target = base.index.name, f'ADM{level}_PCODE'
+    if code == target:
+        return base
+    parents = hierarchy.drop_duplicates(code).set_index(code)[target]
+    return base.groupby(base.index.map(parents).rename(target)).sum()
+
+
+def admin_tables(base: dict[str, pd.DataFrame], hierarchy: pd.DataFrame, level: int) -> dict[str, pd.DataFrame]:
+    """
+    Q3 source counts and per-capita Q4 catch for one admin level, rolled up
+    from `admin_base_tables` and named from the hierarchy.
+    """
+    code, name = f'ADM{level}_PCODE', f'ADM{level}_EN'
+    names = hierarchy.drop_duplicates(code).set_index(code)[name]
+    q3 = rollup_admin(base["Q3"], hierarchy, level).copy()
+    q4 = rollup_admin(base["Q4"], hierarchy, level).copy()
+    q4 = q4.div(q4.pop('Respondents'), axis=0).round(2)
+    for table in (q3, q4):
+        table.insert(0, name, table.index.map(names))
+    return {
+        f"Q3_source_of_fishing_adm{level}": q3.reset_index(),
+        f"Q4_monthly_catch_adm{level}": q4.reset_index()
+    }
+
+
+def _write_tables(results: dict[str, pd.DataFrame], output_dir: str, tables: Optional[set]) -> None:
+    # Each result is written as `{KEY}.csv`, e.g. Q4_monthly_catch_adm1 → Q4_MONTHLY_CATCH_ADM1.csv
+    for key, table in results.items():
+        if tables is None or key in tables:
+            table.to_csv(f"{output_dir}/{key.upper()}.csv", index=False)
+
+
 def preprocess_geo(
-    gdf: gpd.GeoDataFrame,
+    gdf: Optional[gpd.GeoDataFrame] = None,
     survey_dir: str = "DATASETS",
-    output_dir: str = "DATASETS/Cleaned_Data/GEO_DATA"
+    output_dir: str = "DATASETS/Cleaned_Data/GEO_DATA",
+    chunksize: Optional[int] = None,
+    workers: Optional[int] = 1,
+    session: Optional[SurveySession] = None,
+    keep_intermediate: bool = False,
+    units: Optional[pd.Series] = None,
+    tables: Optional[Iterable[str]] = None
 ) -> dict[str, pd.DataFrame]:
     """
     Map district labels and compute geospatial tables for Q3 & Q4.
 
-    - Loads the three Fisher survey CSVs plus species and district label lookups.
+    - Loads the district, Q3 and Q4 columns of the three Fisher survey files
+      (Parquet cache when fresh, else CSV) plus the district label lookup,
+      or reuses them from `session`.
     - Applies district-name mapping.
     - Computes a district-by-source table (Q3) and writes it to CSV.
     - Computes a per-capita district catch table (Q4) and writes it to CSV.
     - Returns both DataFrames in a dict.
+
+    With `chunksize`, the survey files are streamed in row chunks and only
+    mergeable per-district partials are kept, so memory is bounded by the
+    chunk size. With `workers` != 1, each survey shard (Parquet row group or
+    whole CSV) is parsed and reduced to partials in a process pool
+    (None uses every CPU). These two paths sum catch per district code and
+    chunk, then add the subtotals per district name, whereas the in-memory
+    path sums each district name in one pass. Their tables therefore equal
+    the in-memory ones up to float summation order, which can move a value
+    rounded to 2 dp by 0.01.
+    Passing a `SurveySession` (e.g. the one `preprocessing.clean_session`
+    used) skips reloading and always runs in memory.
+    With `keep_intermediate`, the in-memory path also writes the per-fisher
+    catch table to `grouped_df.parquet` for inspection. The chunked and
+    pooled paths keep no per-fisher rows, so combining either of them with
+    `keep_intermediate` or `units` raises ValueError.
+
+    Admin-level tables (`Q3_SOURCE_OF_FISHING_ADM{n}.csv`,
+    `Q4_MONTHLY_CATCH_ADM{n}.csv`) keyed by pcode are written too, from
+    divisions (adm1) down to the fishers' districts (adm2). On the in-memory
+    path, `units` (one admin code per fisher, named 'ADM{n}_PCODE' and
+    aligned with the session rows) extends them down to its level, e.g.
+    upazilas or unions. This needs the adm4 attribute table in
+    `{survey_dir}/shape_files`; without it only the district tables are
+    written.
+
+    `tables` limits the CSVs written to those result keys (e.g.
+    'Q4_monthly_catch_adm1'); on the in-memory path the admin-level tables
+    are then only computed when one of them is requested. `gdf` is not
+    used: the tables are keyed by district name and pcode, and the maps
+    read the boundaries themselves. It is kept for existing callers.
     """
     os.makedirs(output_dir, exist_ok=True)
+    tables = None if tables is None else set(tables)
 
-    # 1) Load survey data & lookup tables
-    df1 = pd.read_csv(f"{survey_dir}/Fisher_slno.1-101.csv",   low_memory=False)
-    df2 = pd.read_csv(f"{survey_dir}/Fisher_slno.102-4291.csv",low_memory=False)
-    df3 = pd.read_csv(f"{survey_dir}/Fisher_slno.4292-7217.csv",low_memory=False)
-    fish_labels     = pd.read_csv(f"{survey_dir}/fish_species.csv",     low_memory=False)
-    district_labels = pd.read_csv(f"{survey_dir}/new_district_labels.csv", low_memory=False)
-
-    # 2) Build lookups
-    FISH_LABELS = pd.Series(
-        fish_labels.Species_Name.values,
-        index=fish_labels.Fish_Species_Serial_Number
-    ).to_dict()
-    DIST_LABELS = pd.Series(
-        district_labels.New_Labels.values,
-        index=district_labels.Old_Labels
-    ).to_dict()
-
-    # 3) Map district codes in both survey data and geodataframe
-    for df in (df1, df2, df3):
-        df['q1_d_zila'] = df['q1_d_zila'].map(DIST_LABELS)
-    gdf = gdf.rename(columns={'ADM2_EN':'q1_d_zila'})
-    gdf['q1_d_zila'] = gdf['q1_d_zila'].astype(str)
+    if session is None and (chunksize or workers != 1):
+        if keep_intermediate or units is not None:
+            raise ValueError("keep_intermediate and units need per-fisher rows; use the in-memory path (no chunksize, workers=1)")
+        district_labels = pd.read_csv(f"{survey_dir}/new_district_labels.csv", low_memory=False)
+        DIST_LABELS = build_district_labels(district_labels)
+        if workers != 1:
+            tasks = [
+                (path, shard, i == 0 and j == 0)
+                for i, path in enumerate(f"{survey_dir}/{name}" for name in FISHER_FILES)
+                for j, shard in enumerate(survey_shards(path))
+            ]
+            parts = map_in_workers(_shard_geo_partials, tasks, workers)
+        else:
+            chunks = (
+                (i == 0 and j == 0, chunk)
+                for i, name in enumerate(FISHER_FILES)
+                for j, chunk in enumerate(iter_survey_file(
+                    f"{survey_dir}/{name}", columns=usecols(GEO_QUESTIONS), chunksize=chunksize
+                ))
+            )
+            parts = (geo_partials(chunk, skip_first=first) for first, chunk in chunks)
+        results = finalize_geo(merge_partials(parts), DIST_LABELS, admin_hierarchy(f"{survey_dir}/shape_files"))
+        _write_tables(results, output_dir, tables)
+        return results
 
-    # —— Q3: Overview of Fishing Techniques by District ——
-    # Collect columns [district + q3_1..q3_5]
-    parts = []
-    for df in (df1, df2, df3):
-        sub = df[['q1_d_zila','q3_1','q3_2','q3_3','q3_4','q3_5']].copy()
-        for col in ['q3_1','q3_2','q3_3','q3_4','q3_5']:
-            sub[col] = sub[col].map(SOURCE)
-        parts.append(sub)
-
-    # Melt and pivot to wide format
-    source_of_fishing = pd.concat(parts).reset_index(drop=True)
-    melted = source_of_fishing.melt(
-        id_vars=['q1_d_zila'],
-        value_vars=['q3_1','q3_2','q3_3','q3_4','q3_5'],
-        var_name='source_type',
-        value_name='Source'
-    ).dropna(subset=['Source'])
+    # 1) Load survey data & district lookup once (or reuse the caller's session)
+    session = session or SurveySession(survey_dir, questions=GEO_QUESTIONS)
 
-    GEO_Q3 = (
-        melted
-        .groupby(['q1_d_zila','Source'], as_index=False)
-        .size()
-        .unstack(fill_value=0)
-        .reset_index()
-    )
-    GEO_Q3.to_csv(f"{output_dir}/Q3_SOURCE_OF_FISHING.csv", index=False)
+    # 2) District codes of the survey rows
+    districts = session.districts
 
-    # —— Q4: Annual Catch Volumes & Per‐Capita by District ——
-    # Grab [district + all q4_* fields]
-    catch1 = df1.iloc[:, [df1.columns.get_loc('q1_d_zila')] + list(range(41, 181))]
-    catch2 = df2.iloc[:, [df2.columns.get_loc('q1_d_zila')] + list(range(41, 181))]
-    catch3 = df3.iloc[:, [df3.columns.get_loc('q1_d_zila')] + list(range(41, 181))]
-    annual_catch = pd.concat([catch1, catch2, catch3]).reset_index(drop=True)
-
-    # Map species codes to names
-    for i in range(1, 11):
-        ncol = f'q4_{i}_n'
-        if ncol in annual_catch.columns:
-            annual_catch[ncol] = annual_catch[ncol].map(FISH_LABELS).fillna('Other Species')
-
-    # Replace unmapped codes
-    for col in annual_catch.columns:
-        if '_n' in col:
-            annual_catch[col].fillna('Other Species', inplace=True)
+    # —— Q3: Overview of Fishing Techniques by District ——
+    # Count sources per district code, then label and pivot to wide format
+    GEO_Q3 = _district_source_table(_district_source_counts(
+        pd.concat([session.block('Q1'), session.block('Q3')], axis=1)
+    ), session.district_labels)
 
-    # Initialize a DataFrame to hold monthly & yearly totals
-    data = {'District': annual_catch['q1_d_zila']}
-    for month in MONTH_MAPPING.values():
-        data[month] = [0] * len(annual_catch)
-    data['Year Total'] = [0] * len(annual_catch)
-    final_df = pd.DataFrame(data)
+    # —— Q4: Annual Catch Volumes & Per‐Capita by District ——
+    # [district + all q4_* fields]; species codes are not needed for the
+    # per-fisher totals, so they are left unmapped
+    annual_catch = pd.concat([districts, session.block('Q4')], axis=1)
 
-    # Identify annual‐total columns (those ending in '_t')
-    year_cols = [c for c in annual_catch.columns if c.endswith('_t')]
+    # Drop the first placeholder row (per original script), in memory
+    per_fisher = _fisher_catch_table(annual_catch).iloc[1:]
+    if keep_intermediate:
+        per_fisher.reset_index(drop=True).to_parquet(f"{output_dir}/grouped_df.parquet", index=False)
 
-    # Populate final_df
-    for idx, row in annual_catch.iterrows():
-        monthly = {m: 0 for m in MONTH_MAPPING.values()}
-        year_total = 0
-        for col, val in row.items():
-            # month columns: q4_f_{i}_{month}
-            m = re.match(r'q4_f_\d+_(\d+)', col)
-            if m:
-                mn = int(m.group(1))
-                name = MONTH_MAPPING[mn]
-                monthly[name] += 0 if pd.isna(val) else val
-            # annual‐total columns
-            if col in year_cols:
-                year_total += 0 if pd.isna(val) else val
-        for mon in MONTH_MAPPING.values():
-            final_df.at[idx, mon] = monthly[mon] / 1000
-        final_df.at[idx, 'Year Total'] = year_total / 1000
-
-    # Save then reload to drop the first placeholder row (per original script)
-    final_df.to_csv(f"{output_dir}/grouped_df.csv", index=False)
-    grouped = pd.read_csv(f"{output_dir}/grouped_df.csv").drop(0).reset_index(drop=True)
-
-    # Aggregate per‐district and convert to per‐capita
-    sum_df   = grouped.groupby('District').sum().reset_index()
-    count_df = grouped.groupby('District').count().reset_index()
-    instances = count_df.iloc[:, -1]
-
-    agg = pd.concat([sum_df, instances], axis=1)
-    agg.columns = list(sum_df.columns) + ['Year Total.1']
-    for mon in MONTHS:
-        agg[mon] = agg[mon] / agg['Year Total.1']
-    agg['Year Total'] = agg['Year Total'] / agg['Year Total.1']
-    agg.drop(columns=['Year Total.1'], inplace=True)
-
-    GEO_Q4 = agg.round(2)
-    GEO_Q4.to_csv(f"{output_dir}/Q4_MONTHLY_CATCH.csv", index=False)
+    # One grouped pass yields per-district catch sums and respondent counts
+    # together; divide to get per-capita values
+    sums = per_fisher.assign(Respondents=1).groupby('District').sum()
+    respondents = sums.pop('Respondents')
+    GEO_Q4 = sums.div(respondents, axis=0).reset_index().round(2)
 
-    return {
+    results = {
         "Q3_source_of_fishing": GEO_Q3,
         "Q4_monthly_catch": GEO_Q4
     }
+
+    # —— Admin levels: one base table at the level of `units`, rolled up to divisions ——
+    hierarchy = admin_hierarchy(f"{survey_dir}/shape_files")
+    if hierarchy is None or (tables is not None and not any(re.search(r'_adm\d$', key) for key in tables)):
+        _write_tables(results, output_dir, tables)
+        return results
+    if units is None:
+        units = districts.map(_district_pcodes(hierarchy)).rename('ADM2_PCODE')
+    finest = next((n for n in ADMIN_LEVELS if units.name == f'ADM{n}_PCODE' and n > 0), None)
+    if finest is None:
+        raise ValueError(f"units must be named 'ADM{{n}}_PCODE' for n in 1..4, got {units.name!r}")
+
+    base = admin_base_tables(units, session.block('Q3'), per_fisher)
+    for level in range(1, finest + 1):
+        results.update(admin_tables(base, hierarchy, level))
+    _write_tables(results, output_dir, tables)
+    return results
@@ -0,0 +1,35 @@
+# lazy_imports.py
+
+import importlib
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    Stand-in for a module that imports it on first attribute access.
+
+    Unlike `importlib.util.LazyLoader` nothing is put in `sys.modules` until
+    the real import, so tools that walk `sys.modules` (Streamlit's file
+    watcher, `inspect.getmodule`) cannot trigger the load by accident.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Module `name`, imported when first used rather than now."""
+    return LazyModule(name)
@@ -1,8 +1,16 @@
 # outputs.py
 
-import plotly.express as px
+from typing import Optional
+
+import pandas as pd
 import plotly.graph_objects as go
 
+from lazy_imports import lazy_import
+
+# Plotly Express loads on the first chart actually built, not when a cached
+# figure is served
+px = lazy_import("plotly.express")
+
 MONTHS = [
     'January--Magh','February--Falgun','March--Chaitra','April--Boishakh',
     'May--Jeystho','June--Asharh','July--Srabon','August--Bhadro',
@@ -457,20 +465,49 @@ def plot_q7_loss_by_reason_bar(df):
     return fig
 
 
-def plot_q12_distribution_sankey(df):
-    """Q12: Sankey diagram of fish distribution channels."""
-    sources, targets, values = [], [], []
-    fish_types = df['q12_b1_nam'].tolist()
+def sankey_links(df, top: Optional[int] = None, min_share: Optional[float] = None) -> pd.Series:
+    """
+    Non-zero flows of a Q12 table (name column, one column per destination,
+    then a total) as a Series indexed by (name, destination).
+    `top` keeps each name's k largest flows and `min_share` those carrying at
+    least that fraction of the name's total; the rest of a name's flow is
+    summed into a single 'Other' destination.
+    """
+    dests = df.columns[1:-1].tolist()
+    flows = df.set_index(df.columns[0])[dests].stack()
+    flows = flows[flows > 0]
+
+    keep = pd.Series(True, index=flows.index)
+    by_name = flows.groupby(level=0, sort=False)
+    if top is not None:
+        keep &= by_name.rank(method='first', ascending=False) <= top
+    if min_share is not None:
+        keep &= flows / by_name.transform('sum') >= min_share
+    if keep.all():
+        return flows
+
+    other = flows[~keep].groupby(level=0, sort=False).sum()
+    other.index = pd.MultiIndex.from_arrays([other.index, ['Other'] * len(other)])
+    return pd.concat([flows[keep], other])
+
+
+def plot_q12_distribution_sankey(df, top: Optional[int] = None, min_share: Optional[float] = None):
+    """
+    Q12: Sankey diagram of fish distribution channels. The first column holds
+    the fish names ('Fish Name'; tables built before it covered every species
+    slot call it `q12_b1_nam`).
+    Pass `top` / `min_share` to prune small flows into 'Other' (see `sankey_links`).
+    """
+    fish_types = df.iloc[:, 0].tolist()
     dests = df.columns[1:-1].tolist()
+    flows = sankey_links(df, top=top, min_share=min_share)
+    if 'Other' in flows.index.get_level_values(1) and 'Other' not in dests:
+        dests.append('Other')
     nodes = fish_types + dests
     mapping = {n: i for i, n in enumerate(nodes)}
-    for _, row in df.iterrows():
-        for dest in dests:
-            v = row[dest]
-            if v > 0:
-                sources.append(mapping[row['q12_b1_nam']])
-                targets.append(mapping[dest])
-                values.append(v)
+    sources = flows.index.get_level_values(0).map(mapping).to_numpy()
+    targets = flows.index.get_level_values(1).map(mapping).to_numpy()
+    values = flows.to_numpy()
     colors = ['#636EFA','#EF553B','#00CC96','#AB63FA','#FFA15A',
               '#19D3F3','#FF6692','#B6E880','#FF97FF','#FECB52']
     fish_colors = colors * ((len(fish_types)//len(colors))+1)
@@ -1,6 +1,15 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
 import pandas as pd
 import numpy as np
 
+from survey_io import FISHER_FILES, iter_survey_file, read_survey_file, read_survey_shard, survey_shards
+from survey_schema import MAIN_QUESTIONS, question_columns, usecols
+from survey_session import SurveySession, build_district_labels, build_fish_labels
+
 # —— Constants & Lookups ——
 MONTHS = [
     'January--Magh','February--Falgun','March--Chaitra','April--Boishakh',
@@ -30,51 +39,356 @@ DISTRIBUTION = {
     'v': 'Consumer','h': 'Hotel Restaurant','d': 'Depot Owner',
     'ac':'Account Holder','r':'Exporter'
 }
+# Exact kg sums are kept as int64 fixed-point limbs: whole kg, then two
+# binary fractions of LIMB_BITS bits each (see `_fixed_sums`)
+LIMB_BITS = 31
+LIMBS = ('kg', 'frac_1', 'frac_2')
 
 
-def load_main_data(data_dir: str = "DATASETS") -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+def load_main_data(
+    data_dir: str = "DATASETS",
+    columns=usecols(MAIN_QUESTIONS),
+    use_cache: bool = True
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
-    Load the three raw survey CSVs plus the fish‐labels CSV.
+    Load the three raw survey files plus the fish‐labels CSV.
+    Survey files are read from the Parquet cache when it is fresh (see
+    `survey_io.build_parquet_cache`), otherwise parsed from CSV. By default
+    only the district and Q3–Q12 columns registered in `survey_schema` are parsed;
+    pass `columns=None` to load every column.
     Returns: (fisher_df_1, fisher_df_2, fisher_df_3, fish_labels)
     """
-    fisher_df_1 = pd.read_csv(f"{data_dir}/Fisher_slno.1-101.csv", low_memory=False)
-    fisher_df_2 = pd.read_csv(f"{data_dir}/Fisher_slno.102-4291.csv", low_memory=False)
-    fisher_df_3 = pd.read_csv(f"{data_dir}/Fisher_slno.4292-7217.csv", low_memory=False)
+    fisher_df_1, fisher_df_2, fisher_df_3 = (
+        read_survey_file(f"{data_dir}/{name}", columns=columns, use_cache=use_cache)
+        for name in FISHER_FILES
+    )
     fish_labels = pd.read_csv(f"{data_dir}/fish_species.csv",    low_memory=False)
     return fisher_df_1, fisher_df_2, fisher_df_3, fish_labels
 
 
-def clean_main_data(
-    fisher_df_1: pd.DataFrame,
-    fisher_df_2: pd.DataFrame,
-    fisher_df_3: pd.DataFrame,
-    fish_labels: pd.DataFrame
-) -> dict[str, pd.DataFrame]:
+def stack_slots(
+    block: pd.DataFrame,
+    name_col: str,
+    value_cols: dict[str, str],
+    slots: Iterable[int] = range(1, 11),
+    complete_only: bool = False
+) -> pd.DataFrame:
     """
-    Apply cleaning & aggregation steps for Q3–Q12.
-    Returns a dict of DataFrames keyed by question.
+    Reshape a repeated species-slot block (Q4, Q6, Q7) into one long table.
+
+    `name_col` and the values of `value_cols` are column templates with an
+    `{x}` slot placeholder, e.g. name_col='q4_{x}_n' and
+    value_cols={'January--Magh': 'q4_f_{x}_1', ...}. Each slot whose species
+    column exists contributes one row per fisher, so the result has columns
+    ['fisher', 'slot', 'species', *value_cols] ordered slot by slot.
+    Missing value columns are NaN, or the slot is skipped with `complete_only`.
     """
-    # 1) Build fish‐label lookup
-    FISH_LABELS = pd.Series(
-        fish_labels.Species_Name.values,
-        index=fish_labels.Fish_Species_Serial_Number
-    ).to_dict()
+    parts = []
+    for x in slots:
+        species_col = name_col.format(x=x)
+        if species_col not in block:
+            continue
+        cols = [template.format(x=x) for template in value_cols.values()]
+        if complete_only and not all(c in block for c in cols):
+            continue
+        part = block.reindex(columns=cols)
+        part.columns = list(value_cols)
+        part.insert(0, 'species', block[species_col].to_numpy())
+        part.insert(0, 'slot', x)
+        part.insert(0, 'fisher', block.index)
+        parts.append(part)
 
-    # —— Q3: Overview of Fishing Techniques ——
-    source_of_fishing = pd.concat([
-        fisher_df_1.iloc[:, 22:27],
-        fisher_df_2.iloc[:, 22:27],
-        fisher_df_3.iloc[:, 22:27]
-    ]).reset_index(drop=True)
-
-    source_count = (
-        source_of_fishing
+    if not parts:
+        return pd.DataFrame(columns=['fisher', 'slot', 'species', *value_cols])
+    return pd.concat(parts, ignore_index=True)
+
+
+def _species_month_rows(block: pd.DataFrame, name_col: str, value_col: str) -> pd.DataFrame:
+    """
+    Monthly kg of every (fisher, slot) with a species code in a species-slot
+    block, slot by slot, with columns ['slot', 'species', *MONTHS].
+    """
+    long = stack_slots(
+        block, name_col,
+        {mon: value_col.replace('{m}', str(idx)) for idx, mon in enumerate(MONTHS, start=1)}
+    )
+    return long.loc[long['species'].notna(), ['slot', 'species', *MONTHS]].reset_index(drop=True)
+
+
+def _fixed_sums(rows: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    """
+    Exact monthly kg sums of `rows` per `keys`, in first-appearance order,
+    as int64 limbs: column (month, limb) for each of `LIMBS`. Integer sums
+    do not depend on the order of the additions, so the partials of any
+    split of the rows add up (`_combine`) to the same totals bit for bit.
+    Exact for every value whose lowest bit is at least 2^-62 kg, which
+    covers every double above 2^-10 kg (about 1 g); lower bits are dropped.
+    """
+    values = np.nan_to_num(rows[MONTHS].to_numpy(dtype=float))
+    whole = np.trunc(values)
+    frac = (values - whole) * 2.0 ** LIMB_BITS
+    mid = np.trunc(frac)
+    low = np.trunc((frac - mid) * 2.0 ** LIMB_BITS)
+    limbs = np.stack([whole, mid, low], axis=-1).astype(np.int64).reshape(len(rows), len(MONTHS) * len(LIMBS))
+    table = pd.DataFrame(limbs, columns=pd.MultiIndex.from_product([MONTHS, LIMBS]))
+    return table.groupby([rows[k].reset_index(drop=True) for k in keys], sort=False).sum()
+
+
+def _from_fixed(sums: pd.DataFrame) -> pd.DataFrame:
+    """Monthly kg from `_fixed_sums` limbs, each the correctly rounded float of its exact sum."""
+    scale = 1 << (2 * LIMB_BITS)
+    return pd.DataFrame({
+        # Python ints are unbounded and int / int rounds correctly
+        month: (
+            (sums[(month, 'kg')].to_numpy().astype(object) * scale
+             + sums[(month, 'frac_1')].to_numpy().astype(object) * (1 << LIMB_BITS)
+             + sums[(month, 'frac_2')].to_numpy().astype(object)) / scale
+        ).astype(float)
+        for month in MONTHS
+    }, index=sums.index)
+
+
+def _label_species(sums: pd.DataFrame, FISH_LABELS: dict) -> pd.DataFrame:
+    """
+    Monthly kg per (slot, species name) from exact per-(slot, code) sums
+    (`_fixed_sums`). Unknown codes become 'Other Species'; groups keep
+    first-appearance order. Codes sharing a name are added exactly, so each
+    total is the correctly rounded sum of its rows however they were split.
+    """
+    names = sums.index.get_level_values('species').map(FISH_LABELS).fillna('Other Species')
+    by_name = sums.groupby([sums.index.get_level_values('slot'), names], sort=False).sum()
+    return _from_fixed(by_name.rename_axis(['slot', 'species']))
+
+
+def _species_month_totals(sums: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn (slot, species) monthly kg sums into metric tonnes per month and
+    add the 'Year Total' column. A stable sort on slot restores the
+    slot-by-slot, first-appearance order however the partials were merged.
+    """
+    totals = (
+        sums
+        .sort_index(level='slot', sort_remaining=False, kind='stable')
+        .div(1000)
+        .reset_index(level='slot', drop=True)
+        .rename_axis('Fish Name')
+        .reset_index()
+    )
+    totals['Year Total'] = sum(totals[m] for m in MONTHS)
+    return totals
+
+
+def _distribution_flows(frame: pd.DataFrame) -> pd.Series:
+    """
+    Kg sold per (species code, channel letter, district code) over every Q12
+    species slot, keeping non-zero cells only. Slot x's species is
+    `q12_b{x}_nam` and its sales through channel ch are `q12_b{x}_{ch}_k`;
+    the district is NaN when the frame has no `q1_d_zila`.
+    """
+    block = frame[question_columns(frame.columns, "Q12")]
+    slots = sorted(
+        int(m.group(1)) for m in map(re.compile(r'q12_b(\d+)_nam').fullmatch, block.columns) if m
+    )
+    long = stack_slots(
+        block, 'q12_b{x}_nam',
+        {ch: f'q12_b{{x}}_{ch}_k' for ch in DISTRIBUTION},
+        slots=slots
+    )
+    long['district'] = (
+        frame['q1_d_zila'].reindex(long['fisher']).to_numpy() if 'q1_d_zila' in frame else np.nan
+    )
+    cells = long.melt(
+        id_vars=['species', 'district'],
+        value_vars=list(DISTRIBUTION),
+        var_name='channel', value_name='kg'
+    )
+    cells = cells[cells['kg'].fillna(0) != 0]
+    return cells.groupby(['species', 'channel', 'district'], sort=False, dropna=False)['kg'].sum()
+
+
+def main_partials(frame: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Compute the partial aggregates behind the Q3–Q12 tables for one survey
+    frame (a whole file or a chunk of rows).
+
+    Partials hold counts and kg sums keyed by the raw source, species, reason
+    and channel codes, slot or month, so partials of disjoint row sets combine
+    with `merge_partials`. The Q4/Q6 species partials are exact fixed-point
+    sums (`_fixed_sums`), so their totals do not depend on how the rows
+    were split.
+    `finalize_main_data` attaches the labels and turns them into the final
+    tables.
+    """
+    partials = {}
+
+    # —— Q3: fisher count per source code ——
+    partials["Q3"] = (
+        frame[question_columns(frame.columns, "Q3")]
         .melt(var_name='Question', value_name='Source')
         .Source
         .value_counts()
-        .rename_axis('Source')
-        .reset_index(name='Count')
     )
+
+    # —— Q4: kg per month (first slot) and per (slot, species) ——
+    annual_catch_totals = frame[question_columns(frame.columns, "Q4")]
+    partials["Q4_monthly"] = pd.Series(
+        [annual_catch_totals.get(f'q4_f_1_{m+1}', pd.Series()).sum() for m in range(12)],
+        index=MONTHS
+    )
+    partials["Q4_species"] = _fixed_sums(_species_month_rows(annual_catch_totals, 'q4_{x}_n', 'q4_f_{x}_{m}'), ['slot', 'species'])
+
+    # —— Q5: kg per source and month ——
+    catch_src = frame[question_columns(frame.columns, "Q5")]
+    # Codes without a name are all 'Others' in the table, so sum them as one source
+    sources = catch_src['q5'].where(catch_src['q5'].isin(list(SOURCE)), 99)
+
+    # Resolve the month columns once (q5_{slot}_{month}, skipping annual
+    # totals), month by month so each month is one contiguous column range
+    month_cols = [
+        [pos for pos, c in enumerate(catch_src.columns) if c.startswith('q5_') and c.endswith(f'_{idx}') and 't' not in c]
+        for idx in range(1, 13)
+    ]
+    bounds = np.cumsum([0, *map(len, month_cols)])
+
+    # Row sums per month over a C-ordered copy, like `DataFrame.sum(axis=1)`;
+    # then each source's rows are summed contiguously in survey order, like
+    # the masked `Series.sum`, so every cell rounds as in the original loop
+    values = np.ascontiguousarray(np.nan_to_num(catch_src.iloc[:, [p for cols in month_cols for p in cols]].to_numpy(dtype=float)))
+    fisher_months = np.column_stack([values[:, bounds[m]:bounds[m + 1]].sum(axis=1) for m in range(12)])
+    codes, source_codes = pd.factorize(sources, use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    groups = np.split(fisher_months[order], np.flatnonzero(np.diff(codes[order])) + 1) if len(codes) else []
+    source_months = np.array([np.ascontiguousarray(group.T).sum(axis=1) for group in groups]).reshape(-1, 12)
+    partials["Q5"] = pd.DataFrame(source_months, index=pd.Index(source_codes, name='Source'), columns=MONTHS)
+
+    # —— Q6: kg wasted per month (all slots) and per (slot, species) ——
+    annual_waste_totals = frame[question_columns(frame.columns, "Q6")]
+    partials["Q6_monthly"] = pd.Series([
+        sum(
+            annual_waste_totals[f'q6_{x}_{m}'].sum()
+            for x in range(1, 11) if f'q6_{x}_{m}' in annual_waste_totals
+        )
+        for m in range(1, 13)
+    ], index=MONTHS)
+    partials["Q6_species"] = _fixed_sums(_species_month_rows(annual_waste_totals, 'q6_{x}_n', 'q6_{x}_{m}'), ['slot', 'species'])
+
+    # —— Q7: kg lost per reason ——
+    df7 = stack_slots(
+        frame[question_columns(frame.columns, "Q7")], 'q7_{x}_n',
+        {
+            'Quantity_Lost_mt': 'q7_{x}_o_1',
+            'Reason_1': 'q7_{x}_o_2_1',
+            'Reason_2': 'q7_{x}_o_2_2',
+            'Quantity_Lost_Reasons_mt': 'q7_{x}_o_3_1'
+        },
+        complete_only=True
+    )
+    df7 = df7[
+        (df7.Quantity_Lost_mt > 0) |
+        (df7.Quantity_Lost_Reasons_mt > 0)
+    ]
+    melted = pd.melt(
+        df7,
+        id_vars=['Quantity_Lost_Reasons_mt'],
+        value_vars=['Reason_1','Reason_2'],
+        var_name='Reason_type', value_name='Reason'
+    )
+    partials["Q7"] = (
+        melted
+        .dropna(subset=['Reason'])
+        .groupby('Reason')['Quantity_Lost_Reasons_mt']
+        .sum()
+    )
+
+    # —— Q12: kg sold per (species, channel, district) ——
+    partials["Q12_flows"] = _distribution_flows(frame)
+
+    return partials
+
+
+def _combine(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    """Add two keyed partials, keeping keys (including NaN codes) in first-appearance order."""
+    return pd.concat([a, b]).groupby(level=list(range(a.index.nlevels)), sort=False, dropna=False).sum()
+
+
+def merge_partials(parts: Iterable[dict[str, pd.DataFrame]]) -> dict[str, pd.DataFrame]:
+    """
+    Fold partial aggregates of disjoint row sets (files, chunks or workers)
+    into one set of partials. Consumes `parts` lazily, so only the running
+    total is held in memory.
+    """
+    merged = None
+    for part in parts:
+        merged = part if merged is None else {
+            key: _combine(merged[key], part[key]) for key in merged
+        }
+    return merged
+
+
+def map_in_workers(fn: Callable, tasks: list[tuple], workers: Optional[int] = 1) -> Iterator:
+    """
+    Apply `fn(*task)` to every task, in a process pool when `workers` != 1
+    (None uses every CPU). Results come back in task order, so merging them
+    gives the same answer as the serial path.
+    """
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(tasks) <= 1:
+        return (fn(*task) for task in tasks)
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        return iter(list(pool.map(fn, *zip(*tasks))))
+
+
+def slice_flows(
+    flows: pd.DataFrame,
+    species: Optional[Iterable[str]] = None,
+    channels: Optional[Iterable[str]] = None,
+    districts: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """
+    Filter a Q12 flow table (`Q12_flows`) to the given fish names, channel
+    names and/or districts; None keeps everything along that axis.
+    """
+    mask = pd.Series(True, index=flows.index)
+    for col, keep in (('Fish Name', species), ('Channel', channels), ('District', districts)):
+        if keep is not None:
+            mask &= flows[col].isin(list(keep))
+    return flows[mask]
+
+
+def flow_matrix(flows: pd.DataFrame, top: Optional[int] = 10) -> pd.DataFrame:
+    """
+    Species × channel view of a Q12 flow table in metric tonnes, summed over
+    districts, in the layout of Q12_WHERE_DOES_THE_FISH_END_UP.csv: the
+    species column 'Fish Name', one column per channel, then 'Total (mt)'.
+    Keeps the `top` species by total (None keeps all), rounded to 2 dp.
+    """
+    matrix = (
+        flows
+        .groupby(['Fish Name', 'Channel'], observed=True)['Total (mt)']
+        .sum()
+        .unstack(fill_value=0)
+        .reindex(columns=list(DISTRIBUTION.values()), fill_value=0)
+    )
+    matrix['Total (mt)'] = matrix.sum(axis=1)
+    matrix = matrix.sort_values('Total (mt)', ascending=False)
+    if top is not None:
+        matrix = matrix.head(top)
+    return matrix.round(2).rename_axis(index='Fish Name', columns=None).reset_index()
+
+
+def finalize_main_data(
+    partials: dict[str, pd.DataFrame],
+    FISH_LABELS: dict,
+    DIST_LABELS: Optional[dict] = None
+) -> dict[str, pd.DataFrame]:
+    """
+    Turn merged partials into the Q3–Q12 tables (metric tonnes, rounded),
+    attaching source, species, reason and channel labels. Q12 districts are
+    named when `DIST_LABELS` is given, otherwise left as survey codes.
+    Returns a dict of DataFrames keyed by question.
+    """
+    # —— Q3: Overview of Fishing Techniques ——
+    source_count = partials["Q3"].rename_axis('Source').reset_index(name='Count')
     source_count['Source Desc'] = source_count['Source'].map(SOURCE).fillna('Others')
     SOURCE_OF_FISHING_DF = (
         source_count
@@ -84,47 +398,14 @@ def clean_main_data(
     )
 
     # —— Q4: Annual Catch Volumes & Species Harvest ——
-    annual_catch_totals = pd.concat([
-        fisher_df_1.iloc[:, 41:181],
-        fisher_df_2.iloc[:, 41:181],
-        fisher_df_3.iloc[:, 41:181]
-    ]).reset_index(drop=True)
-
-    # Map species codes to names
-    for x in range(1, 11):
-        col = f'q4_{x}_n'
-        if col in annual_catch_totals:
-            annual_catch_totals[col] = annual_catch_totals[col].map(FISH_LABELS).fillna('Other Species')
-
-    # Total per month
     MONTHLY_CATCH_DF = pd.DataFrame({
         'Month': MONTHS,
-        'Total': [
-            (annual_catch_totals.get(f'q4_f_1_{m+1}', pd.Series()).sum()) / 1000
-            for m in range(12)
-        ]
+        'Total': (partials["Q4_monthly"] / 1000).to_numpy()
     }).round(2)
 
-    # Top 10 species annual totals
-    species_totals = []
-    for x in range(1, 11):
-        fish_col = f'q4_{x}_n'
-        if fish_col not in annual_catch_totals:
-            continue
-        for species in annual_catch_totals[fish_col].dropna().unique():
-            row = {'Fish Name': species, 'Year Total': 0}
-            for idx, mon in enumerate(MONTHS, start=1):
-                col = f'q4_f_{x}_{idx}'
-                val = (
-                    annual_catch_totals.loc[annual_catch_totals[fish_col] == species, col].sum() / 1000
-                    if col in annual_catch_totals else 0
-                )
-                row[mon] = val
-                row['Year Total'] += val
-            species_totals.append(row)
-
+    species_totals = _species_month_totals(_label_species(partials["Q4_species"], FISH_LABELS))[['Fish Name', 'Year Total', *MONTHS]]
     MONTHLY_FISH_CATCH_DF = (
-        pd.DataFrame(species_totals)
+        species_totals
         .query("`Fish Name` != 'Other Species'")
         .sort_values('Year Total', ascending=False)
         .head(10)
@@ -132,65 +413,20 @@ def clean_main_data(
     )
 
     # —— Q5: Yearly Catch Totals by Harvesting Source ——
-    catch_src = pd.concat([
-        fisher_df_1.iloc[:, 181:322],
-        fisher_df_2.iloc[:, 251:392],
-        fisher_df_3.iloc[:, 251:392]
-    ]).reset_index(drop=True)
-    catch_src['q5'] = catch_src['q5'].map(SOURCE).fillna('Others')
-
-    data = []
-    for src in catch_src['q5'].dropna().unique():
-        row = {'Source': src}
-        for idx, mon in enumerate(MONTHS, start=1):
-            cols = [
-                c for c in catch_src
-                if c.startswith(f'q5_') and c.endswith(f'_{idx}') and 't' not in c
-            ]
-            row[mon] = catch_src.loc[catch_src['q5'] == src, cols].sum(axis=1).sum() / 1000
-        row['Total'] = sum(row[m] for m in MONTHS)
-        data.append(row)
-    MONTHLY_TOTALS_BY_SOURCE_DF = pd.DataFrame(data).round(2)
+    by_source = partials["Q5"]
+    source_names = by_source.index.map(SOURCE).fillna('Others').rename('Source')
+    MONTHLY_TOTALS_BY_SOURCE_DF = (by_source.groupby(source_names, sort=False).sum() / 1000).reset_index()
+    MONTHLY_TOTALS_BY_SOURCE_DF['Total'] = sum(MONTHLY_TOTALS_BY_SOURCE_DF[m] for m in MONTHS)
+    MONTHLY_TOTALS_BY_SOURCE_DF = MONTHLY_TOTALS_BY_SOURCE_DF.round(2)
 
     # —— Q6: Annual Wastage Volumes & Species Waste ——
-    annual_waste_totals = pd.concat([
-        fisher_df_1.iloc[:, 322:434],
-        fisher_df_2.iloc[:, 392:504],
-        fisher_df_3.iloc[:, 392:504]
-    ]).reset_index(drop=True)
-
-    for x in range(1, 11):
-        col = f'q6_{x}_n'
-        if col in annual_waste_totals:
-            annual_waste_totals[col] = annual_waste_totals[col].map(FISH_LABELS).fillna('Other Species')
-
-    # Total wastage per month (all species)
-    monthly_waste = []
-    for m in range(1, 13):
-        total = 0
-        for x in range(1, 11):
-            col = f'q6_{x}_{m}'
-            if col in annual_waste_totals:
-                total += annual_waste_totals[col].sum()
-        monthly_waste.append(total / 1000)
-    MONTHLY_WASTE_DF = pd.DataFrame({'Month': MONTHS, 'Total': monthly_waste}).round(2)
-
-    # Top 10 waste species
-    species_data = []
-    for x in annual_waste_totals.filter(like='_n').columns:
-        num = x.split('_')[1]
-        for sp in annual_waste_totals[x].dropna().unique():
-            vals = []
-            for idx, mon in enumerate(MONTHS, start=1):
-                c = f'q6_{num}_{idx}'
-                vals.append(
-                    (annual_waste_totals.loc[annual_waste_totals[x] == sp, c].sum() / 1000)
-                    if c in annual_waste_totals else 0
-                )
-            species_data.append({'Fish Name': sp, **dict(zip(MONTHS, vals)), 'Year Total': sum(vals)})
+    MONTHLY_WASTE_DF = pd.DataFrame({
+        'Month': MONTHS,
+        'Total': (partials["Q6_monthly"] / 1000).to_numpy()
+    }).round(2)
 
     MONTHLY_FISH_WASTE_DF = (
-        pd.DataFrame(species_data)
+        _species_month_totals(_label_species(partials["Q6_species"], FISH_LABELS))
         .query("`Fish Name` != 'Other Species'")
         .sort_values('Year Total', ascending=False)
         .head(10)
@@ -198,51 +434,14 @@ def clean_main_data(
     )
 
     # —— Q7: Specific Causes of Fish Waste ——
-    waste_reason_df = pd.concat([
-        fisher_df_1.iloc[:, 434:714],
-        fisher_df_2.iloc[:, 504:784],
-        fisher_df_3.iloc[:, 504:784]
-    ]).reset_index(drop=True)
-
-    for x in range(1, 11):
-        col = f'q7_{x}_n'
-        if col in waste_reason_df:
-            waste_reason_df[col] = waste_reason_df[col].map(FISH_LABELS).fillna('Other Species')
-
-    portions = []
-    for x in range(1, 11):
-        req = [
-            f'q7_{x}_n', f'q7_{x}_o_1',
-            f'q7_{x}_o_2_1', f'q7_{x}_o_2_2', f'q7_{x}_o_3_1'
-        ]
-        if all(c in waste_reason_df for c in req):
-            tmp = waste_reason_df[req].copy()
-            tmp.columns = [
-                'Fish Name', 'Quantity_Lost_mt',
-                'Reason_1', 'Reason_2', 'Quantity_Lost_Reasons_mt'
-            ]
-            portions.append(tmp)
-
-    df7 = pd.concat(portions)
-    df7['Reason_1'] = df7['Reason_1'].map(REASONS)
-    df7['Reason_2'] = df7['Reason_2'].map(REASONS)
-    df7 = df7[
-        (df7.Quantity_Lost_mt > 0) |
-        (df7.Quantity_Lost_Reasons_mt > 0)
-    ]
-
-    melted = pd.melt(
-        df7,
-        id_vars=['Fish Name','Quantity_Lost_mt','Quantity_Lost_Reasons_mt'],
-        value_vars=['Reason_1','Reason_2'],
-        var_name='Reason_type', value_name='Reason'
-    )
+    by_reason = partials["Q7"]
     final7 = (
-        melted
-        .dropna(subset=['Reason'])
-        .groupby('Reason', as_index=False)['Quantity_Lost_Reasons_mt']
+        by_reason
+        .groupby(by_reason.index.map(REASONS))
         .sum()
-        .rename(columns={'Quantity_Lost_Reasons_mt':'total_quantity_lost_mt'})
+        .rename('total_quantity_lost_mt')
+        .rename_axis('Reason')
+        .reset_index()
     )
     ANNUAL_LOSS_BY_REASON_DF = (
         final7
@@ -252,11 +451,20 @@ def clean_main_data(
     )
 
     # —— Q12: Distribution Channels of the Fish ——
-    fish_sold_df = pd.concat([
-        fisher_df_1.iloc[:, 792:1114],
-        fisher_df_2.iloc[:, 891:1213],
-        fisher_df_3.iloc[:, 891:1213]
-    ]).reset_index(drop=True)
+    # Sparse flow table: one row per non-zero (species, channel, district)
+    flows = partials["Q12_flows"].rename('Total (mt)').div(1000).reset_index()
+    flows['Fish Name'] = flows.pop('species').map(FISH_LABELS).fillna('Other Species')
+    flows['Channel'] = pd.Categorical(flows.pop('channel').map(DISTRIBUTION), categories=list(DISTRIBUTION.values()))
+    districts = flows.pop('district')
+    flows['District'] = districts.map(DIST_LABELS) if DIST_LABELS is not None else districts
+    flows = (
+        flows
+        .groupby(['Fish Name', 'Channel', 'District'], observed=True, dropna=False)['Total (mt)']
+        .sum()
+        .reset_index()
+    )
+    DISTRIBUTION_FLOWS_DF = flows[flows['Total (mt)'] != 0].round(3).reset_index(drop=True)
+    WHERE_DOES_THE_FISH_END_UP_DF = flow_matrix(flows)
 
     return {
         "Q3_source_of_fishing": SOURCE_OF_FISHING_DF,
@@ -266,5 +474,100 @@ def clean_main_data(
         "Q6_monthly_waste": MONTHLY_WASTE_DF,
         "Q6_top_waste_species": MONTHLY_FISH_WASTE_DF,
         "Q7_loss_by_reason": ANNUAL_LOSS_BY_REASON_DF,
-        "Q12_distribution": fish_sold_df
+        "Q12_distribution": WHERE_DOES_THE_FISH_END_UP_DF,
+        "Q12_flows": DISTRIBUTION_FLOWS_DF,
     }
+
+
+def clean_main_data(
+    fisher_df_1: pd.DataFrame,
+    fisher_df_2: pd.DataFrame,
+    fisher_df_3: pd.DataFrame,
+    fish_labels: pd.DataFrame,
+    workers: Optional[int] = 1,
+    district_labels: Optional[pd.DataFrame] = None
+) -> dict[str, pd.DataFrame]:
+    """
+    Apply cleaning & aggregation steps for Q3–Q12.
+    With `workers` != 1 the per-file partial aggregates are computed in a
+    process pool (None uses every CPU). Both paths merge the same per-file
+    partials in file order, so their results are identical. Kg totals other
+    than the exact Q4/Q6 species sums are added per file first, so they equal
+    one pass over all rows up to float summation order.
+    Pass `district_labels` (new_district_labels.csv) to name the Q12 flow districts.
+    Returns a dict of DataFrames keyed by question.
+    """
+    FISH_LABELS = build_fish_labels(fish_labels)
+    DIST_LABELS = None if district_labels is None else build_district_labels(district_labels)
+    frames = (fisher_df_1, fisher_df_2, fisher_df_3)
+
+    return finalize_main_data(merge_partials(map_in_workers(
+        main_partials, [(df,) for df in frames], workers
+    )), FISH_LABELS, DIST_LABELS)
+
+
+def clean_session(session: SurveySession, workers: Optional[int] = 1) -> dict[str, pd.DataFrame]:
+    """
+    `clean_main_data` over a shared `SurveySession`: reuses the session's
+    parsed Fisher files and species lookup instead of loading them again,
+    so the geo pipeline can run on the same session afterwards.
+    """
+    return finalize_main_data(merge_partials(map_in_workers(
+        main_partials, [(df,) for df in session.frames], workers
+    )), session.fish_labels, session.district_labels)
+
+
+def _read_labels(data_dir: str) -> tuple[dict, dict]:
+    """FISH_LABELS and DIST_LABELS from the lookup CSVs in `data_dir`."""
+    fish_labels = pd.read_csv(f"{data_dir}/fish_species.csv", low_memory=False)
+    district_labels = pd.read_csv(f"{data_dir}/new_district_labels.csv", low_memory=False)
+    return build_fish_labels(fish_labels), build_district_labels(district_labels)
+
+
+def _shard_partials(path: str, shard: Optional[int], use_cache: bool) -> dict[str, pd.DataFrame]:
+    """Worker task: parse one survey shard and return its partial aggregates."""
+    frame = read_survey_shard(path, shard, columns=usecols(MAIN_QUESTIONS), use_cache=use_cache)
+    return main_partials(frame)
+
+
+def build_main_data(
+    data_dir: str = "DATASETS",
+    workers: Optional[int] = None,
+    use_cache: bool = True
+) -> dict[str, pd.DataFrame]:
+    """
+    Parallel `load_main_data` + `clean_main_data`: each worker parses one
+    survey shard (a Parquet row group, or a whole CSV when the cache is not
+    built) and computes its partial aggregates; the parent merges them in
+    file order. `workers=None` uses every CPU, `workers=1` runs serially.
+    """
+    FISH_LABELS, DIST_LABELS = _read_labels(data_dir)
+
+    tasks = [
+        (path, shard, use_cache)
+        for path in (f"{data_dir}/{name}" for name in FISHER_FILES)
+        for shard in survey_shards(path, use_cache)
+    ]
+    return finalize_main_data(merge_partials(map_in_workers(_shard_partials, tasks, workers)), FISH_LABELS, DIST_LABELS)
+
+
+def stream_main_data(
+    data_dir: str = "DATASETS",
+    chunksize: int = 50_000,
+    use_cache: bool = True
+) -> dict[str, pd.DataFrame]:
+    """
+    Out-of-core variant of `load_main_data` + `clean_main_data`.
+    Reads the Fisher files in row chunks of `chunksize` and folds per-chunk
+    partial aggregates, so peak memory is bounded by the chunk size rather
+    than the survey size.
+    """
+    FISH_LABELS, DIST_LABELS = _read_labels(data_dir)
+    columns = usecols(MAIN_QUESTIONS)
+
+    chunks = (
+        chunk
+        for name in FISHER_FILES
+        for chunk in iter_survey_file(f"{data_dir}/{name}", columns=columns, chunksize=chunksize, use_cache=use_cache)
+    )
+    return finalize_main_data(merge_partials(main_partials(chunk) for chunk in chunks), FISH_LABELS, DIST_LABELS)
@@ -0,0 +1,161 @@
+# render_figures.py
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+import plotly.graph_objects as go
+
+import outputs
+from boundary_cache import INDEX_NAME, build_boundary_cache, build_district_layer, cache_dir, is_layer_fresh, layer_path
+from figure_cache import FigureCache, figure_key
+from geospatial_outputs import ADMIN_UNIT_NAMES, plot_admin_choropleth, plot_q3_choropleth, plot_q4_choropleth
+
+# —— Paths ——
+# Absolute, like app.py's, so both compute the same figure keys
+BASE_DIR = Path(__file__).parent
+CLEANED = BASE_DIR / "DATASETS" / "Cleaned_Data"
+GEO_CLEANED = CLEANED / "GEO_DATA"
+SHAPEFILE = BASE_DIR / "DATASETS" / "shape_files" / "shape.shp"
+FIGURE_DIR = CLEANED / ".figure_cache"
+HTML_DIRNAME = "html"
+
+# Files the maps read besides their table; a change to any re-renders them
+MAP_FILES = [str(SHAPEFILE), os.path.join(cache_dir(str(SHAPEFILE.parent)), INDEX_NAME), layer_path(str(SHAPEFILE))]
+
+# —— Dashboard charts ——
+# Cleaned CSV → every chart variant the Interactive Visuals tab can show for it
+CHARTS = {
+    "Q3_SOURCE_OF_FISHING.csv": [outputs.plot_q3_source_bar, outputs.plot_q3_source_grouped_bar],
+    "Q4_MONTHLY_CATCH.csv": [
+        outputs.plot_q4_monthly_catch_bar, outputs.plot_q4_monthly_catch_line, outputs.plot_q4_monthly_catch_area,
+    ],
+    "Q4_MONTHLY_FISH_CATCH.csv": [
+        outputs.plot_q4_top_species_bar, outputs.plot_q4_top_species_box,
+        outputs.plot_q4_top_species_stacked_bar, outputs.plot_q4_top_species_line,
+    ],
+    "Q5_MONTHLY_TOTALS_BY_SOURCE.csv": [
+        outputs.plot_q5_annual_catch_by_source_bar, outputs.plot_q5_monthly_catch_by_source_line,
+    ],
+    "Q6_MONTHLY_WASTE.csv": [
+        outputs.plot_q6_monthly_waste_bar, outputs.plot_q6_monthly_waste_line, outputs.plot_q6_monthly_waste_area,
+    ],
+    "Q6_MONTHLY_FISH_WASTE.csv": [outputs.plot_q6_top_waste_species_bar, outputs.plot_q6_top_waste_species_box],
+    "Q7_ANNUAL_LOSS_BY_REASON.csv": [outputs.plot_q7_loss_by_reason_bar],
+    "Q12_WHERE_DOES_THE_FISH_END_UP.csv": [outputs.plot_q12_distribution_sankey],
+}
+
+# One figure to render: (artifact name, plot function, args, kwargs, extra input files)
+FigureSpec = tuple[str, Callable[..., go.Figure], tuple, dict, list[str]]
+
+
+def figure_specs() -> list[FigureSpec]:
+    """
+    Every (chart, variant) app.py can display whose table exists, with the
+    arguments app.py passes, so prebuilt figures land under the same keys.
+    """
+    specs = []
+    for csv, plots in CHARTS.items():
+        if (CLEANED / csv).exists():
+            df = pd.read_csv(CLEANED / csv)
+            specs.extend((fn.__name__, fn, (df,), {}, []) for fn in plots)
+
+    if SHAPEFILE.exists():
+        if (GEO_CLEANED / "Q3_SOURCE_OF_FISHING.csv").exists():
+            geo3 = pd.read_csv(GEO_CLEANED / "Q3_SOURCE_OF_FISHING.csv")
+            specs.append(("plot_q3_choropleth", plot_q3_choropleth, (geo3,), {"shapefile": str(SHAPEFILE)}, MAP_FILES))
+        if (GEO_CLEANED / "Q4_MONTHLY_CATCH.csv").exists():
+            geo4 = pd.read_csv(GEO_CLEANED / "Q4_MONTHLY_CATCH.csv")
+            if "District" in geo4.columns:
+                geo4 = geo4.rename(columns={"District": "q1_d_zila"})
+            specs.append(("plot_q4_choropleth", plot_q4_choropleth, (geo4,), {"shapefile": str(SHAPEFILE)}, MAP_FILES))
+
+    for level in ADMIN_UNIT_NAMES:
+        if not (GEO_CLEANED / f"Q4_MONTHLY_CATCH_ADM{level}.csv").exists():
+            continue
+        geo3 = pd.read_csv(GEO_CLEANED / f"Q3_SOURCE_OF_FISHING_ADM{level}.csv")
+        sources = [c for c in geo3.columns if not c.startswith("ADM")]
+        specs.append((f"plot_admin_choropleth_adm{level}_q3", plot_admin_choropleth,
+                      (geo3, level, sources, "Fishing Source Counts"), {}, MAP_FILES))
+        geo4 = pd.read_csv(GEO_CLEANED / f"Q4_MONTHLY_CATCH_ADM{level}.csv")
+        months = [c for c in geo4.columns if not c.startswith("ADM")]
+        specs.append((f"plot_admin_choropleth_adm{level}_q4", plot_admin_choropleth,
+                      (geo4, level, months, "Per Capita Fishing Catch"), {}, MAP_FILES))
+    return specs
+
+
+def render_figure(
+    name: str,
+    fn: Callable[..., go.Figure],
+    args: tuple,
+    kwargs: dict,
+    files: list[str],
+    figure_dir: str,
+    html: bool,
+    force: bool
+) -> tuple[str, bool, float]:
+    """
+    Worker task: render one figure into the figure cache unless it is
+    already there, optionally writing `<figure_dir>/html/<name>.html`.
+    Returns (name, rendered, seconds).
+    """
+    start = time.perf_counter()
+    cache = FigureCache(figure_dir)
+    key = figure_key(fn, args, kwargs, files)
+    spec = None if force else cache.get(key)
+    rendered = spec is None
+    if rendered:
+        spec = fn(*args, **kwargs).to_json()
+        cache.put(key, spec)
+    if html:
+        os.makedirs(os.path.join(figure_dir, HTML_DIRNAME), exist_ok=True)
+        go.Figure(json.loads(spec), _validate=False).write_html(
+            os.path.join(figure_dir, HTML_DIRNAME, f"{name}.html"), include_plotlyjs="cdn"
+        )
+    return name, rendered, time.perf_counter() - start
+
+
+def render_all(
+    workers: Optional[int] = None,
+    html: bool = False,
+    force: bool = False,
+    figure_dir: str = str(FIGURE_DIR)
+) -> list[tuple[str, bool, float]]:
+    """
+    Pre-render every dashboard figure into `figure_dir`, the disk tier the
+    app's `FigureCache` reads, across a process pool (`workers=None` uses
+    every CPU). Figures already cached for the current data and code are
+    skipped unless `force=True`.
+    """
+    from preprocessing import map_in_workers
+
+    # Build the map geometry first: the figure keys depend on it, and the
+    # workers must not race to write it
+    if SHAPEFILE.exists():
+        build_boundary_cache(shape_dir=str(SHAPEFILE.parent))
+        if not is_layer_fresh(str(SHAPEFILE)):
+            build_district_layer(str(SHAPEFILE))
+
+    tasks = [(*spec, figure_dir, html, force) for spec in figure_specs()]
+    results = list(map_in_workers(render_figure, tasks, workers))
+    # Every current figure was just written or read, so pruning drops stale ones first
+    FigureCache(figure_dir).prune()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render every dashboard figure into the figure cache.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: every CPU)")
+    parser.add_argument("--html", action="store_true", help="also write standalone HTML per figure")
+    parser.add_argument("--force", action="store_true", help="re-render figures that are already cached")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = render_all(workers=args.workers, html=args.html, force=args.force)
+    for name, rendered, seconds in results:
+        print(f"{'rendered' if rendered else 'cached'} → {name} ({seconds:.2f}s)")
+    print(f"{sum(r for _, r, _ in results)} of {len(results)} figures rendered in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,58 @@
+# startup_benchmark.py
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# —— Budget ——
+# Modules app.py imports at start-up, on top of what Streamlit itself loads
+STARTUP_MODULES = ("outputs", "geospatial_outputs", "boundary_cache", "figure_cache", "render_figures", "downloads", "table_query")
+BASELINE_MODULES = ("pandas", "streamlit")
+# Stacks that must load on first use only, never at start-up
+DEFERRED_MODULES = ("geopandas", "shapely", "pyproj", "pyogrio", "plotly.express", "duckdb")
+BUDGET_MS = 60
+RUNS = 5
+
+# Runs in a fresh interpreter so every import is cold
+_PROBE = """
+import json, sys, time
+for name in {baseline!r}:
+    __import__(name)
+start = time.perf_counter()
+for name in {startup!r}:
+    __import__(name)
+elapsed = (time.perf_counter() - start) * 1000
+loaded = [name for name in {deferred!r} if name in sys.modules]
+print(json.dumps({{"ms": elapsed, "loaded": loaded}}))
+"""
+
+
+def measure_startup(runs: int = RUNS) -> dict:
+    """
+    Import the dashboard's start-up modules in `runs` fresh interpreters
+    after the baseline Streamlit stack. Returns the fastest time in ms and
+    the deferred modules that were loaded anyway.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    code = _PROBE.format(baseline=BASELINE_MODULES, startup=STARTUP_MODULES, deferred=DEFERRED_MODULES)
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {"ms": min(r["ms"] for r in results), "loaded": sorted({m for r in results for m in r["loaded"]})}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail when the dashboard's start-up imports exceed their budget.")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="allowed start-up import time")
+    parser.add_argument("--runs", type=int, default=RUNS, help="fresh interpreters to time (fastest counts)")
+    args = parser.parse_args()
+
+    result = measure_startup(args.runs)
+    print(f"start-up imports: {result['ms']:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if result["loaded"]:
+        print(f"loaded eagerly: {', '.join(result['loaded'])}")
+    if result["ms"] > args.budget_ms or result["loaded"]:
+        sys.exit(1)
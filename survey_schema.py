@@ -0,0 +1,73 @@
+# survey_schema.py
+
+import re
+from typing import Callable, Iterable, Optional
+
+# —— Survey Schema Registry ——
+# Each question maps to the column-name patterns the pipeline consumes.
+# Patterns are matched against the whole column name, so blocks are found by
+# name in every survey file regardless of where the wave placed them.
+SURVEY_SCHEMA = {
+    # District of the respondent
+    "Q1":  [r"q1_d_zila"],
+    # Up to five fishing sources per fisher
+    "Q3":  [r"q3_[1-5]"],
+    # 10 species slots: species code, 12 monthly catches (kg), annual total
+    "Q4":  [r"q4_\d+_n", r"q4_f_\d+_(\d+|t)"],
+    # Source code, then per-slot species code, 12 monthly catches, annual total
+    "Q5":  [r"q5", r"q5_\d+_(n|\d+|t)"],
+    # Species slots: species code, 12 monthly waste amounts (kg), annual total
+    "Q6":  [r"q6_\d+_(n|\d+|t)"],
+    # Species slots: species code, quantity lost, two reasons, quantity lost to reasons
+    "Q7":  [r"q7_\d+_(n|o_1|o_2_1|o_2_2|o_3_1)"],
+    # Species slots: species name code, then per-channel kg (_k) and price (_t)
+    "Q12": [r"q12_b\d+_(nam|[a-z]+_[kt])"],
+}
+
+# Columns holding categorical codes (district, source, species, reason) rather
+# than amounts. They are kept as small integer codes and only labelled at output.
+CODE_PATTERNS = [
+    r"q1_d_zila", r"q3_[1-5]", r"q5", r"q\d+_\d+_n", r"q7_\d+_o_2_[12]", r"q12_b\d+_nam",
+]
+
+MAIN_QUESTIONS = ("Q1", "Q3", "Q4", "Q5", "Q6", "Q7", "Q12")
+GEO_QUESTIONS = ("Q1", "Q3", "Q4")
+
+
+def _pattern(questions: Iterable[str]) -> re.Pattern:
+    unknown = [q for q in questions if q not in SURVEY_SCHEMA]
+    if unknown:
+        raise KeyError(f"Unknown survey question(s): {unknown}")
+    return re.compile("|".join(f"(?:{p})" for q in questions for p in SURVEY_SCHEMA[q]))
+
+
+def is_code_column(name: str) -> bool:
+    """True for columns registered in `CODE_PATTERNS`."""
+    return any(re.fullmatch(p, name) for p in CODE_PATTERNS)
+
+
+def question_columns(columns: Iterable[str], question: str) -> list[str]:
+    """
+    Resolve one question's columns within a file, keeping the file's column order.
+    """
+    pattern = _pattern([question])
+    return [c for c in columns if pattern.fullmatch(c)]
+
+
+def resolve_schema(columns: Iterable[str], questions: Optional[Iterable[str]] = None) -> dict[str, list[str]]:
+    """
+    Resolve every requested question (default: all) against one file's header.
+    Returns {question: [column names in file order]}.
+    """
+    columns = list(columns)
+    return {q: question_columns(columns, q) for q in (questions or SURVEY_SCHEMA)}
+
+
+def usecols(questions: Optional[Iterable[str]] = None) -> Callable[[str], bool]:
+    """
+    Build a column predicate for `pd.read_csv(usecols=...)` or
+    `survey_io.read_survey_file(columns=...)` that keeps only the columns
+    of the given questions (default: all registered questions).
+    """
+    pattern = _pattern(list(questions or SURVEY_SCHEMA))
+    return lambda name: pattern.fullmatch(name) is not None
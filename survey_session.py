@@ -0,0 +1,92 @@
+# survey_session.py
+
+from functools import cached_property
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from survey_io import FISHER_FILES, read_survey_file
+from survey_schema import SURVEY_SCHEMA, question_columns, usecols
+
+
+def build_fish_labels(fish_labels: pd.DataFrame) -> dict:
+    """Species serial number → species name lookup from fish_species.csv."""
+    return pd.Series(
+        fish_labels.Species_Name.values,
+        index=fish_labels.Fish_Species_Serial_Number
+    ).to_dict()
+
+
+def build_district_labels(district_labels: pd.DataFrame) -> dict:
+    """Survey district code → shapefile district name lookup from new_district_labels.csv."""
+    return pd.Series(
+        district_labels.New_Labels.values,
+        index=district_labels.Old_Labels
+    ).to_dict()
+
+
+def _normalise_dtypes(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give every survey column a numeric dtype. All registered question columns
+    hold codes or kg amounts; stray text (blank strings, typos) becomes NaN.
+    Code columns read from the Parquet cache are already float32
+    (see `survey_io.compact_dtypes`).
+    """
+    for col in frame.columns[frame.dtypes == object]:
+        frame[col] = pd.to_numeric(frame[col], errors='coerce')
+    return frame
+
+
+class SurveySession:
+    """
+    One load of the raw survey inputs, shared by `preprocessing` and
+    `geospatial_preprocessing`.
+
+    The Fisher files are parsed once (only the columns of `questions`), the
+    species and district lookups are built once, and derived blocks such as
+    the concatenated Q4 catch slice are computed on first use and memoized.
+    Blocks are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "DATASETS",
+        questions: Optional[Iterable[str]] = None,
+        use_cache: bool = True
+    ):
+        self.data_dir = data_dir
+        self.questions = tuple(questions or SURVEY_SCHEMA)
+        self.use_cache = use_cache
+        self._blocks: dict[str, pd.DataFrame] = {}
+
+    @cached_property
+    def frames(self) -> tuple[pd.DataFrame, ...]:
+        """The raw Fisher files, projected to the session's questions."""
+        columns = usecols(self.questions)
+        return tuple(
+            _normalise_dtypes(read_survey_file(f"{self.data_dir}/{name}", columns=columns, use_cache=self.use_cache))
+            for name in FISHER_FILES
+        )
+
+    @cached_property
+    def fish_labels(self) -> dict:
+        fish_labels = pd.read_csv(f"{self.data_dir}/fish_species.csv", low_memory=False)
+        return build_fish_labels(fish_labels)
+
+    @cached_property
+    def district_labels(self) -> dict:
+        district_labels = pd.read_csv(f"{self.data_dir}/new_district_labels.csv", low_memory=False)
+        return build_district_labels(district_labels)
+
+    def block(self, question: str) -> pd.DataFrame:
+        """One question's columns concatenated across the Fisher files (memoized)."""
+        if question not in self._blocks:
+            self._blocks[question] = pd.concat([
+                df[question_columns(df.columns, question)] for df in self.frames
+            ]).reset_index(drop=True)
+        return self._blocks[question]
+
+    @cached_property
+    def districts(self) -> pd.Series:
+        """District name of every fisher, aligned with `block(...)` rows."""
+        return self.block("Q1")['q1_d_zila'].map(self.district_labels)
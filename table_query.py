@@ -0,0 +1,219 @@
+# table_query.py
+
+import argparse
+import importlib.util
+import threading
+import time
+from functools import reduce
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from downloads import CACHE_DIR, build_payload
+from lazy_imports import lazy_import
+
+# —— Constants ——
+PAGE_SIZE = 50
+# Rows decoded per batch when paging through an unfiltered table
+SCAN_BATCH_ROWS = 65_536
+# Preview filter → the columns that hold it across the cleaned tables
+DIMENSIONS = {
+    "district": ("District", "q1_d_zila"),
+    "species": ("Fish Name", "q12_b1_nam"),
+    "month": ("Month",),
+    "source": ("Source", "Source Desc"),
+}
+MONTHS = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+# column → allowed values; rows must match every entry
+Filters = dict[str, list]
+
+# DuckDB is optional: without it queries run on pyarrow datasets. Either way
+# it is imported on the first query, not at start-up
+duckdb = lazy_import("duckdb") if importlib.util.find_spec("duckdb") else None
+
+_local = threading.local()
+
+
+def columnar_path(path: str, cache_dir: str = CACHE_DIR) -> str:
+    """Parquet copy of a cleaned CSV, shared with the Parquet download and rebuilt after each edit."""
+    return build_payload(path, "parquet", cache_dir)
+
+
+def table_columns(parquet_path: str) -> list[str]:
+    """Column names from the Parquet footer, without reading any rows."""
+    import pyarrow.parquet as pq
+
+    return pq.read_schema(parquet_path).names
+
+
+def month_columns(columns: Iterable[str]) -> list[str]:
+    """Columns of a wide table that hold one month each (`January--Magh`, ...)."""
+    return [c for c in columns if c.split("--")[0] in MONTHS]
+
+
+def table_dimensions(columns: Iterable[str]) -> dict[str, str]:
+    """Preview filter → the column of this table that holds it, for the filters it supports."""
+    columns = list(columns)
+    found = {}
+    for dimension, candidates in DIMENSIONS.items():
+        match = next((c for c in candidates if c in columns), None)
+        if match is not None:
+            found[dimension] = match
+    return found
+
+
+def plan_query(columns: list[str], selections: dict[str, list]) -> tuple[Filters, Optional[list[str]]]:
+    """
+    Turn preview selections (dimension → chosen values) into row filters and
+    a column projection. A month selection filters rows of long tables
+    (`Month` column) and projects the chosen month columns of wide ones.
+    """
+    dimensions = table_dimensions(columns)
+    filters = {dimensions[d]: values for d, values in selections.items() if values and d in dimensions}
+    projection = None
+    months = [m for m in selections.get("month") or [] if m in MONTHS]
+    wide = month_columns(columns)
+    if months and wide and "month" not in dimensions:
+        projection = [c for c in columns if c not in wide or c.split("--")[0] in months]
+    return filters, projection
+
+
+# —— Engines ——
+def _connection():
+    # DuckDB connections are not thread-safe; keep one per server thread
+    if getattr(_local, "con", None) is None:
+        _local.con = duckdb.connect()
+    return _local.con
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _query_duckdb(
+    parquet_path: str, filters: Filters, columns: Optional[list[str]], offset: int, limit: int
+) -> tuple[pd.DataFrame, int]:
+    clauses, params = [], [parquet_path]
+    for column, values in filters.items():
+        clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    select = ", ".join(map(_quote, columns)) if columns else "*"
+    con = _connection()
+    # LIMIT/OFFSET without ORDER BY follows file order (DuckDB preserves insertion order by default)
+    total = con.execute(f"SELECT count(*) FROM read_parquet(?){where}", params).fetchone()[0]
+    page = con.execute(f"SELECT {select} FROM read_parquet(?){where} LIMIT ? OFFSET ?", [*params, limit, offset]).df()
+    return page, total
+
+
+def _page_unfiltered(parquet_path: str, columns: Optional[list[str]], offset: int, limit: int) -> tuple[pd.DataFrame, int]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Row counts come from the footer: skip whole row groups before the
+    # page and decode only the batches that overlap it
+    pf = pq.ParquetFile(parquet_path)
+    groups, skip, seen = [], offset, 0
+    for i in range(pf.num_row_groups):
+        rows = pf.metadata.row_group(i).num_rows
+        if seen + rows > offset and seen < offset + limit:
+            groups.append(i)
+        elif seen + rows <= offset:
+            skip -= rows
+        seen += rows
+    parts, kept = [], 0
+    for batch in pf.iter_batches(batch_size=max(limit, SCAN_BATCH_ROWS), row_groups=groups, columns=columns):
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        parts.append(batch.slice(skip, limit - kept))
+        kept += parts[-1].num_rows
+        skip = 0
+        if kept >= limit:
+            break
+    schema = pf.schema_arrow if columns is None else pa.schema([pf.schema_arrow.field(c) for c in columns])
+    return pa.Table.from_batches(parts, schema=schema).to_pandas(), pf.metadata.num_rows
+
+
+def _query_pyarrow(
+    parquet_path: str, filters: Filters, columns: Optional[list[str]], offset: int, limit: int
+) -> tuple[pd.DataFrame, int]:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    if not filters:
+        return _page_unfiltered(parquet_path, columns, offset, limit)
+
+    # Read text columns dictionary-encoded, so the filters compare codes rather than strings
+    schema = ds.dataset(parquet_path, format="parquet").schema
+    text = [f.name for f in schema if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)]
+    fmt = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=text))
+    expression = reduce(lambda a, b: a & b, [pc.field(column).isin(values) for column, values in filters.items()])
+    scanner = ds.dataset(parquet_path, format=fmt).scanner(columns=columns, filter=expression)
+
+    # One pass: count every match, keep only the rows of the requested page
+    total, parts = 0, []
+    for batch in scanner.to_batches():
+        start, stop = max(offset - total, 0), min(offset + limit - total, batch.num_rows)
+        if stop > start:
+            parts.append(batch.slice(start, stop - start))
+        total += batch.num_rows
+    page = pa.Table.from_batches(parts, schema=scanner.projected_schema)
+    plain = pa.schema([f.with_type(f.type.value_type) if pa.types.is_dictionary(f.type) else f for f in page.schema])
+    return page.cast(plain).to_pandas(), total
+
+
+def query_table(
+    path: str,
+    filters: Optional[Filters] = None,
+    columns: Optional[list[str]] = None,
+    page: int = 0,
+    page_size: int = PAGE_SIZE,
+    cache_dir: str = CACHE_DIR,
+    engine: Optional[str] = None
+) -> tuple[pd.DataFrame, int]:
+    """
+    One page of a cleaned table, filtered and projected where it is stored.
+    Returns (rows of page `page`, number of rows matching `filters`).
+
+    Queries run in process against the table's Parquet copy, with DuckDB
+    when it is installed and pyarrow datasets otherwise (`engine=` forces
+    either). Both push the filters and the column list down to the Parquet
+    reader, so only the matching row groups and the requested columns are
+    read.
+    """
+    engine = engine or ("duckdb" if duckdb is not None else "pyarrow")
+    run = _query_duckdb if engine == "duckdb" else _query_pyarrow
+    return run(columnar_path(path, cache_dir), filters or {}, columns, page * page_size, page_size)
+
+
+def distinct_values(path: str, column: str, cache_dir: str = CACHE_DIR) -> list:
+    """Sorted distinct non-null values of one column, reading only that column."""
+    import pyarrow.parquet as pq
+
+    values = pq.read_table(columnar_path(path, cache_dir), columns=[column]).column(column).unique()
+    return sorted(v for v in values.to_pylist() if v is not None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time a filtered, paginated preview of a cleaned table.")
+    parser.add_argument("path", help="cleaned CSV")
+    parser.add_argument("--where", nargs=2, action="append", metavar=("COLUMN", "VALUE"), default=[], help="row filter")
+    parser.add_argument("--columns", nargs="+", default=None, help="columns to return")
+    parser.add_argument("--page", type=int, default=0, help="page number, from 0")
+    parser.add_argument("--engine", choices=["duckdb", "pyarrow"], default=None, help="default: DuckDB when installed")
+    args = parser.parse_args()
+
+    filters: Filters = {}
+    for column, value in args.where:
+        filters.setdefault(column, []).append(value)
+    columnar_path(args.path)
+    start = time.perf_counter()
+    rows, total = query_table(args.path, filters, args.columns, args.page, engine=args.engine)
+    print(rows.to_string(max_rows=10))
+    print(f"page {args.page}: {len(rows)} of {total} rows in {(time.perf_counter() - start) * 1000:.0f} ms")
@@ -0,0 +1,30 @@
+# tests/test_figure_cache.py
+
+import os
+
+from figure_cache import FigureCache
+
+
+def test_memory_budget_counts_bytes_not_characters():
+    label = "ইলিশ" * 100  # 400 characters, 1200 bytes in UTF-8
+    cache = FigureCache(cache_dir=None, max_bytes=2000)
+
+    cache.put("a", label)
+    cache.put("b", label)
+
+    assert cache._bytes == 1200
+    assert cache.get("a") is None
+    assert cache.get("b") == label
+
+
+def test_prune_drops_least_recently_used_files(tmp_path):
+    cache = FigureCache(str(tmp_path), max_disk_bytes=250)
+    for age, key in enumerate(["new", "mid", "old"]):
+        cache.put(key, "x" * 100)
+        os.utime(tmp_path / f"{key}.json", (1_000_000 - age, 1_000_000 - age))
+    FigureCache(str(tmp_path)).get("old")  # a disk hit counts as a use
+
+    removed = cache.prune()
+
+    assert removed == [str(tmp_path / "mid.json")]
+    assert sorted(os.listdir(tmp_path)) == ["new.json", "old.json"]
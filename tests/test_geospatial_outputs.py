@@ -0,0 +1,54 @@
+# tests/test_geospatial_outputs.py
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+import geospatial_outputs
+from geospatial_outputs import plot_admin_choropleth, plot_q3_choropleth
+
+
+@pytest.fixture
+def districts(tmp_path) -> tuple[gpd.GeoDataFrame, str]:
+    gdf = gpd.GeoDataFrame(
+        {"ADM2_EN": ["Dhaka", "Khulna", "Sylhet"]},
+        geometry=[box(90, 23, 91, 24), box(89, 22, 90, 23), box(91, 24, 92, 25)],
+        crs="EPSG:4326",
+    )
+    path = tmp_path / "shape.shp"
+    gdf.to_file(path)
+    return gdf, str(path)
+
+
+def test_repeated_district_is_summed(districts):
+    _, shapefile = districts
+    q3 = pd.DataFrame({"q1_d_zila": ["Dhaka", "Khulna", "Dhaka"], "River": [2, 5, 3]})
+
+    trace = plot_q3_choropleth(q3, shapefile=shapefile).data[0]
+
+    assert list(trace.locations) == ["Dhaka", "Khulna"]
+    assert list(trace.z) == [5, 5]
+
+
+def test_legacy_gdf_keyword_warns_and_matches(districts):
+    gdf, shapefile = districts
+    q3 = pd.DataFrame({"q1_d_zila": ["Sylhet", "Dhaka"], "River": [4, 1], "Pond": [0, 7]})
+
+    with pytest.warns(DeprecationWarning):
+        legacy = plot_q3_choropleth(gdf=gdf, q3_df=q3).data[0]
+    current = plot_q3_choropleth(q3, shapefile=shapefile).data[0]
+
+    assert list(legacy.locations) == list(current.locations)
+    assert np.array_equal(legacy.z, current.z)
+
+
+def test_admin_map_without_boundary_cache_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(geospatial_outputs, "SHAPE_DIR", tmp_path)
+    table = pd.DataFrame({"ADM1_PCODE": ["BD30"], "ADM1_EN": ["Dhaka"], "January--Magh": [1.0]})
+
+    with pytest.raises(FileNotFoundError, match="adm1 boundaries"):
+        plot_admin_choropleth(table, 1, ["January--Magh"], "Catch")
+
+    assert not (tmp_path / ".boundary_cache").exists()
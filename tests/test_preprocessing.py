@@ -0,0 +1,87 @@
+# tests/test_preprocessing.py
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import (
+    MONTHS, SOURCE, _fixed_sums, _label_species, _species_month_rows, _species_month_totals, main_partials, merge_partials
+)
+
+# Codes 7 and 8 are both 'Rui'. Rounded per code and then added, January
+# comes to 5.474999… t; summed exactly over the rows it is 5.475 t
+LABELS = {7: "Rui", 8: "Rui", 9: "Ilish"}
+KG = [765.15, 987.6, 2222.2, 1500.05]
+
+
+def _waste_block(codes: list, kg: list) -> pd.DataFrame:
+    return pd.DataFrame({"q6_1_n": codes, "q6_1_1": kg, "q6_1_2": [1.0] * len(codes)})
+
+
+def _waste_sums(block: pd.DataFrame) -> pd.DataFrame:
+    return _fixed_sums(_species_month_rows(block, "q6_{x}_n", "q6_{x}_{m}"), ["slot", "species"])
+
+
+def _waste_table(*blocks: pd.DataFrame) -> pd.DataFrame:
+    parts = [{"Q6_species": _waste_sums(b)} for b in blocks]
+    return _species_month_totals(_label_species(merge_partials(parts)["Q6_species"], LABELS)).round(2)
+
+
+def test_codes_sharing_a_name_sum_exactly_over_the_rows():
+    table = _waste_table(_waste_block([8, 7, 7, 7], KG))
+    rui = table.set_index("Fish Name").loc["Rui"]
+
+    assert rui[MONTHS[0]] == round(pd.Series(KG).sum() / 1000, 2) == 5.48
+    assert rui[MONTHS[1]] == 0.0
+    assert list(table["Fish Name"]) == ["Rui"]
+
+
+def test_split_partials_match_a_single_frame():
+    codes, kg = [8, 9, 7, None, 7, 7], [KG[0], 50.0, KG[1], 10.0, KG[2], KG[3]]
+    whole = _waste_table(_waste_block(codes, kg))
+    split = _waste_table(_waste_block(codes[:2], kg[:2]), _waste_block(codes[2:], kg[2:]))
+
+    pd.testing.assert_frame_equal(whole, split)
+    assert list(whole["Fish Name"]) == ["Rui", "Ilish"]
+
+
+def test_species_sums_do_not_depend_on_chunking():
+    rng = np.random.default_rng(3)
+    codes = list(rng.choice([7, 8, 9, 10], 600))
+    kg = list(np.round(rng.random(600) * rng.choice([1, 100, 10_000], 600), 2))
+    whole = _label_species(_waste_sums(_waste_block(codes, kg)), LABELS)
+    cuts = [0, 1, 37, 38, 250, 599, 600]
+    merged = merge_partials({"Q6_species": _waste_sums(_waste_block(codes[a:b], kg[a:b]))} for a, b in zip(cuts, cuts[1:]))
+
+    pd.testing.assert_frame_equal(whole, _label_species(merged["Q6_species"], LABELS), check_exact=True)
+    # The merged partial holds one row per (slot, code), not the 600 rows
+    assert len(merged["Q6_species"]) == 4
+
+
+def test_q5_matches_the_masked_row_sum_loop():
+    # Ten slots per month, so row sums go through NumPy's unrolled pairwise sum
+    rng = np.random.default_rng(5)
+    n = 2000
+    columns = {"q5": rng.choice([1, 4, 7, 99, 55, np.nan], n)}
+    for slot in range(1, 11):
+        for month in range(1, 13):
+            kg = np.round(rng.random(n) * rng.choice([10, 1000], n), 2)
+            kg[rng.random(n) < 0.5] = np.nan
+            columns[f"q5_{slot}_{month}"] = kg
+        columns[f"q5_{slot}_t"] = rng.random(n)
+    frame = pd.DataFrame(columns)
+
+    named = frame.assign(q5=frame["q5"].map(SOURCE).fillna("Others"))
+    expected = pd.DataFrame(
+        [
+            [
+                named.loc[named["q5"] == src, [f"q5_{slot}_{month}" for slot in range(1, 11)]].sum(axis=1).sum()
+                for month in range(1, 13)
+            ]
+            for src in named["q5"].unique()
+        ],
+        index=named["q5"].unique(), columns=MONTHS,
+    )
+    q5 = main_partials(frame)["Q5"]
+
+    assert list(q5.index.map(SOURCE)) == list(expected.index)
+    np.testing.assert_array_equal(q5.to_numpy(), expected.to_numpy())